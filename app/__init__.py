@@ -1,8 +1,11 @@
 import os
+import json
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from dotenv import load_dotenv
+from app import database
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -17,8 +20,13 @@ def create_app(test_config=None):
     
     app.config.from_mapping(
         SECRET_KEY=os.environ.get('SECRET_KEY', 'dev'),
-        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(app.instance_path, 'crm.sqlite')}",
+        # PostgreSQL и другие базы подключаются через DATABASE_URL
+        SQLALCHEMY_DATABASE_URI=database.database_uri(app.instance_path),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        # Как считать общее число записей в списках: exact, estimate или none
+        PAGINATION_TOTAL=os.environ.get('PAGINATION_TOTAL', 'estimate'),
+        # Пул соединений и PRAGMA для SQLite, см. app/database.py
+        **database.config_from_env()
     )
 
     if test_config is None:
@@ -27,6 +35,8 @@ def create_app(test_config=None):
     else:
         # Загружаем тестовую конфигурацию
         app.config.from_mapping(test_config)
+    
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', database.engine_options(app.config))
 
     # Убеждаемся, что директория instance существует
     try:
@@ -38,20 +48,62 @@ def create_app(test_config=None):
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
+    
+    with app.app_context():
+        database.configure_sqlite(db.engine, app.config)
+    
+    # Хэширование паролей в ограниченном пуле потоков
+    from app.services import passwords
+    passwords.init_app(app)
 
     # Регистрируем модели
-    from app.models import User, Customer, Contact, Task
+    from app.models import User, Customer, Contact, Task, StatCounter, SchemaMigration
+    from app import migrations
+    
+    # Регистрируем обработчики событий, поддерживающие счетчики
+    from app.services import counters
+    
+    # Регистрируем создание полнотекстового индекса вместе с таблицами
+    from app.services import search
+    
+    # Кэш отрендеренных фрагментов карточки клиента и дашборда
+    from app.services import fragments
+    fragments.init_app(app)
+    
+    # ETag для условных GET-запросов страниц клиентов и задач
+    from app.services import conditional
+    conditional.init_app(app)
+    
+    # Метрики запросов (METRICS_ENABLED=1): Server-Timing, журнал медленных ответов, /admin/metrics
+    from app.services import metrics
+    metrics.init_app(app)
+    
+    # Очередь фоновых задач, которую выполняет flask worker
+    from app.services import jobs
+    jobs.init_app(app)
+    
+    # Напоминания о сроках задач и хранилище их доставки (файлы или SMTP)
+    from app.services import reminders
+    reminders.init_app(app)
     
     # Регистрируем blueprints
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
     from app.routes.customer import customer_bp
     from app.routes.task import task_bp
+    from app.routes.admin import admin_bp
+    from app.routes.reports import reports_bp
+    from app.routes.jobs import jobs_bp
+    from app.routes.reminders import reminders_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(customer_bp)
     app.register_blueprint(task_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(reports_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(reminders_bp)
     
     # Добавляем команду для инициализации базы данных
     @app.cli.command('init-db')
@@ -59,11 +111,153 @@ def create_app(test_config=None):
         """Очищает существующие данные и создает новые таблицы."""
         db.drop_all()
         db.create_all()
+        migrations.stamp()
         print('Инициализирована база данных.')
+    
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Обновляет схему существующей базы данных без потери данных."""
+        applied = migrations.upgrade()
+        for version, description in applied:
+            print(f'Применена миграция {version}: {description}')
+        if not applied:
+            print('База данных уже в актуальном состоянии.')
+    
+    @app.cli.command('rebuild-counters')
+    def rebuild_counters_command():
+        """Пересчитывает счетчики клиентов и задач по статусам."""
+        counters.rebuild_counters()
+        print('Счетчики пересчитаны.')
+    
+    @app.cli.command('rollup')
+    @click.option('--from', 'first', type=click.DateTime(['%Y-%m-%d']), help='Пересчитать итоги начиная с этого дня (ГГГГ-ММ-ДД).')
+    @click.option('--to', 'last', type=click.DateTime(['%Y-%m-%d']), help='Последний пересчитываемый день (по умолчанию вчера).')
+    def rollup_command(first, last):
+        """Досчитывает дневные итоги по задачам и клиентам после последней отметки."""
+        from app.services import rollup
+        report = rollup.rollup(first.date() if first else None, last.date() if last else None)
+        print(f'Пересчитано дней: {report.days}, строк итогов по задачам: {report.task_rows}, '
+              f'по клиентам: {report.customer_rows}.')
+        done = rollup.watermark()
+        print(f'Итоги посчитаны по {done:%d.%m.%Y}.' if done else 'Итоги еще не посчитаны.')
+    
+    @app.cli.command('worker')
+    @click.option('--processes', '-p', default=1, show_default=True, help='Число процессов-исполнителей.')
+    @click.option('--threads', '-t', default=1, show_default=True, help='Потоков-исполнителей в каждом процессе.')
+    @click.option('--once', is_flag=True, help='Выполнить задачи, которые уже в очереди, и завершиться.')
+    def worker_command(processes, threads, once):
+        """Выполняет фоновые задачи из очереди (импорт, выгрузки, удаление, пересчет итогов)."""
+        print(f'Исполнители фоновых задач: процессов {processes}, потоков в каждом {threads}.')
+        jobs.run_worker(app, processes, threads, once)
+    
+    @app.cli.command('reminders')
+    @click.option('--every', 'interval', type=int, help='Запускать каждые N секунд, пока не прервут (по умолчанию один раз).')
+    def reminders_command(interval):
+        """Создает сводки напоминаний о сроках задач с прошлого запуска и отправляет их."""
+        if interval:
+            print(f'Напоминания каждые {interval} с.')
+            try:
+                reminders.run_forever(app, interval)
+            except KeyboardInterrupt:
+                pass
+            return
+        report = reminders.run()
+        if report.window_start is None:
+            print('Окно уже обработано другим запуском.')
+            return
+        print(f'Окно {report.window_start:%d.%m.%Y %H:%M} — {report.window_end:%d.%m.%Y %H:%M}: '
+              f'сводок {report.digests}, просроченных задач {report.overdue}, '
+              f'со сроком в ближайшее время {report.due_soon}; '
+              f'отправлено {report.delivered}, ошибок отправки {report.failed}.')
+    
+    @app.cli.command('reindex-search')
+    def reindex_search_command():
+        """Перестраивает полнотекстовый индекс клиентов и контактов."""
+        if search.reindex():
+            print('Поисковый индекс перестроен.')
+        else:
+            print('Полнотекстовый поиск доступен только для SQLite.')
+    
+    @app.cli.command('import-customers')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Формат файла (по умолчанию по расширению).')
+    @click.option('--batch-size', default=1000, show_default=True, help='Клиентов в одной транзакции.')
+    @click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Куда записать отчет об ошибках (CSV).')
+    def import_customers_command(path, fmt, batch_size, errors_path):
+        """Импортирует клиентов и контакты из CSV или JSONL."""
+        from app.services import importer
+        try:
+            report = importer.import_file(path, fmt, batch_size)
+        except importer.ImportFormatError as e:
+            raise click.ClickException(str(e))
+        print(f'Обработано строк: {report.rows}, импортировано клиентов: {report.customers}, '
+              f'контактов: {report.contacts}, строк с ошибками: {report.error_count}.')
+        if errors_path:
+            importer.write_error_report(report, errors_path)
+            print(f'Отчет об ошибках записан в {errors_path}.')
+        else:
+            for line, messages in report.errors:
+                print(f'Строка {line}: ' + '; '.join(messages))
+    
+    @app.cli.command('bench-passwords')
+    @click.option('--method', 'methods', multiple=True, help='Метод Werkzeug, например pbkdf2:sha256:600000 (можно несколько).')
+    @click.option('--seconds', default=2.0, show_default=True, help='Длительность замера для каждого метода.')
+    def bench_passwords_command(methods, seconds):
+        """Сравнивает число входов в секунду на одно ядро для разных параметров хэширования."""
+        results = passwords.benchmark(methods or passwords.BENCHMARK_METHODS, seconds)
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    
+    @app.cli.command('export')
+    @click.argument('entity', type=click.Choice(['customers', 'contacts', 'tasks']))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+    @click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Файл для выгрузки (по умолчанию stdout).')
+    @click.option('--status', help='Только записи с этим статусом.')
+    @click.option('--user', 'user_id', type=int, help='Только задачи этого пользователя.')
+    @click.option('--customer', 'customer_id', type=int, help='Только контакты и задачи этого клиента.')
+    def export_command(entity, fmt, output, status, user_id, customer_id):
+        """Выгружает клиентов, контакты или задачи в CSV или JSONL."""
+        from app.services import exporter
+        for chunk in exporter.generate(entity, fmt, status=status, user_id=user_id, customer_id=customer_id):
+            output.write(chunk)
+    
+    @app.cli.command('seed-synthetic')
+    @click.option('--customers', default=1000, show_default=True, help='Сколько клиентов создать.')
+    @click.option('--contacts-per', default=2, show_default=True, help='Контактов на клиента.')
+    @click.option('--tasks-per', default=3, show_default=True, help='Задач на клиента.')
+    @click.option('--users', default=5, show_default=True, help='Сколько пользователей создать (0 — раздать задачи существующим).')
+    @click.option('--batch-size', default=1000, show_default=True, help='Клиентов в одной транзакции.')
+    @click.option('--seed', 'random_seed', type=int, help='Зерно генератора для воспроизводимых данных.')
+    def seed_synthetic_command(customers, contacts_per, tasks_per, users, batch_size, random_seed):
+        """Заполняет базу синтетическими клиентами, контактами и задачами."""
+        from app.services import synthetic
+        report = synthetic.seed(customers, contacts_per, tasks_per, users, batch_size, random_seed)
+        print(json.dumps(report.as_dict(), ensure_ascii=False))
+        if report.users:
+            print(f'Пароль созданных пользователей: {synthetic.SYNTHETIC_PASSWORD}')
+    
+    @app.cli.command('benchmark')
+    @click.option('--sizes', default='100,1000,10000', show_default=True, help='Числа клиентов через запятую; для каждого создается своя временная база.')
+    @click.option('--contacts-per', default=2, show_default=True)
+    @click.option('--tasks-per', default=3, show_default=True)
+    @click.option('--users', default=5, show_default=True)
+    @click.option('--requests', 'repeat', default=50, show_default=True, help='Запросов к каждой странице.')
+    @click.option('--login-requests', 'login_repeat', default=5, show_default=True, help='Входов в систему (каждый проверяет пароль).')
+    @click.option('--no-cache', is_flag=True, help='Отключить кэш фрагментов, чтобы мерить полный рендеринг.')
+    @click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Файл для результатов JSON (по умолчанию stdout).')
+    def benchmark_command(sizes, contacts_per, tasks_per, users, repeat, login_repeat, no_cache, output):
+        """Меряет p50/p99 и число SQL-запросов основных страниц на синтетических данных."""
+        from app import benchmark
+        config = {'FRAGMENT_CACHE': 'null'} if no_cache else None
+        results = benchmark.run([int(size) for size in sizes.split(',')], contacts_per, tasks_per,
+                                users, repeat, login_repeat, config)
+        output.write(json.dumps(results, ensure_ascii=False, indent=2) + '\n')
         
+    # Кэш пользователей: current_user берется из памяти без запроса к базе
+    from app.services import identity
+    identity.init_app(app)
+    
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User
-        return User.query.get(int(user_id))
+        return identity.load_identity(int(user_id))
     
     return app 
\ No newline at end of file
@@ -0,0 +1,95 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from sqlalchemy import select
+from app import create_app, db
+from app.models import User, Customer
+from app.services import synthetic
+from app.services.metrics import percentile
+from app.testing import count_queries
+
+# Нагрузочный прогон основных страниц тестовым клиентом Flask на синтетических данных.
+#
+# Для каждого размера данных создается отдельная временная база SQLite,
+# заполняется через app.services.synthetic и по каждой странице снимаются
+# p50/p99 времени ответа и число SQL-запросов на запрос. Результат — словарь,
+# который flask benchmark печатает как JSON, чтобы сравнивать замеры до и после изменений.
+
+# Страницы, которые меряются; customer.view открывается для случайных клиентов
+ENDPOINTS = ('main.dashboard', 'customer.index', 'customer.view', 'task.index', 'auth.login')
+
+def _measure(app, fn, repeat):
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        with count_queries(app) as counter:
+            started = time.perf_counter()
+            response = fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.request.path}: HTTP {response.status_code}')
+        queries.append(counter.count)
+    timings.sort()
+    return {
+        'requests': repeat,
+        'p50_ms': percentile(timings, 50),
+        'p99_ms': percentile(timings, 99),
+        'mean_queries': round(sum(queries) / len(queries), 1),
+        'max_queries': max(queries),
+    }
+
+def _login(client, username):
+    return client.post('/auth/login', data={'username': username, 'password': synthetic.SYNTHETIC_PASSWORD})
+
+def benchmark_size(customers, contacts_per=2, tasks_per=3, users=5, repeat=50, login_repeat=5,
+                   config=None, random_seed=0):
+    """Заполняет временную базу и меряет страницы ENDPOINTS; возвращает словарь с результатами."""
+    directory = tempfile.mkdtemp(prefix='crm-benchmark-')
+    try:
+        app = create_app(dict({
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'benchmark.sqlite'),
+            'FRAGMENT_CACHE_DIR': os.path.join(directory, 'fragment-cache'),
+        }, **(config or {})))
+
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            report = synthetic.seed(customers, contacts_per, tasks_per, users, random_seed=random_seed)
+            seed_seconds = time.perf_counter() - started
+            username = db.session.scalar(select(User.username).where(User.username.like('synthetic%'))
+                                         .order_by(User.id))
+            customer_ids = db.session.scalars(select(Customer.id)).all()
+
+        rng = random.Random(random_seed)
+        client = app.test_client()
+        _login(client, username)
+
+        results = {
+            'main.dashboard': _measure(app, lambda: client.get('/dashboard'), repeat),
+            'customer.index': _measure(app, lambda: client.get('/customers/'), repeat),
+            'customer.view': _measure(app, lambda: client.get(f'/customers/{rng.choice(customer_ids)}'), repeat),
+            'task.index': _measure(app, lambda: client.get('/tasks/'), repeat),
+            # Каждый вход — новым клиентом, иначе уже вошедшего пользователя просто перенаправят
+            'auth.login': _measure(app, lambda: _login(app.test_client(), username), login_repeat),
+        }
+        return {
+            'data': report.as_dict(),
+            'seed_seconds': round(seed_seconds, 2),
+            'endpoints': results,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def run(sizes, contacts_per=2, tasks_per=3, users=5, repeat=50, login_repeat=5, config=None):
+    """Прогоняет benchmark_size для каждого числа клиентов из sizes."""
+    return {
+        'config': {'contacts_per': contacts_per, 'tasks_per': tasks_per, 'users': users,
+                   'repeat': repeat, 'login_repeat': login_repeat, **(config or {})},
+        'sizes': [dict(customers=size, **benchmark_size(size, contacts_per, tasks_per, users,
+                                                        repeat, login_repeat, config))
+                  for size in sizes],
+    }
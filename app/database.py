@@ -0,0 +1,83 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Настройки пула соединений и SQLite по умолчанию; переопределяются
+# переменными окружения или instance/config.py
+DEFAULTS = {
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT': 5000,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_FOREIGN_KEYS': True,
+}
+
+def database_uri(instance_path):
+    """Адрес базы из DATABASE_URL, иначе файл SQLite в каталоге instance."""
+    uri = os.environ.get('DATABASE_URL')
+    if not uri:
+        return f"sqlite:///{os.path.join(instance_path, 'crm.sqlite')}"
+    # Некоторые хостинги отдают устаревшую схему postgres://
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def config_from_env():
+    """Значения DEFAULTS с учетом переменных окружения с теми же именами."""
+    config = {}
+    for key, default in DEFAULTS.items():
+        value = os.environ.get(key)
+        if value is None:
+            config[key] = default
+        elif isinstance(default, bool):
+            config[key] = value.lower() in ('1', 'true', 'yes', 'on')
+        elif isinstance(default, int):
+            config[key] = int(value)
+        else:
+            config[key] = value
+    return config
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+def engine_options(config):
+    """Параметры create_engine для SQLALCHEMY_ENGINE_OPTIONS."""
+    options = {
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+    if not is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        options['pool_size'] = config['DB_POOL_SIZE']
+        options['max_overflow'] = config['DB_MAX_OVERFLOW']
+    return options
+
+def configure_sqlite(engine, config):
+    """Включает WAL и остальные PRAGMA для каждого нового соединения SQLite.
+
+    В режиме WAL чтение не блокируется записью, поэтому дашборд
+    не ждет завершения конкурентных изменений задач. Внешние ключи
+    SQLite по умолчанию не проверяет, без них не работает ON DELETE CASCADE.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA foreign_keys = {'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'}",
+    ]
+    # Для базы в памяти журнал WAL не поддерживается
+    if engine.url.database not in (None, '', ':memory:'):
+        pragmas.insert(0, f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, TextAreaField, SelectField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, Email, Length, Optional
 
@@ -33,4 +34,11 @@ class ContactForm(FlaskForm):
     phone = StringField('Телефон', validators=[Optional(), Length(max=20)])
     is_primary = BooleanField('Основной контакт')
     notes = TextAreaField('Примечания', validators=[Optional()])
-    submit = SubmitField('Сохранить') 
\ No newline at end of file
+    submit = SubmitField('Сохранить')
+
+class ImportForm(FlaskForm):
+    file = FileField('Файл CSV или JSONL', validators=[
+        FileRequired(message='Выберите файл для импорта'),
+        FileAllowed(['csv', 'jsonl', 'ndjson'], message='Поддерживаются только файлы CSV и JSONL')
+    ])
+    submit = SubmitField('Импортировать')
\ No newline at end of file
@@ -1,7 +1,38 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SelectField, DateTimeField, SubmitField
-from wtforms.validators import DataRequired, Length, Optional
+from wtforms.validators import DataRequired, Length, Optional, ValidationError
 from datetime import datetime
+from app import db
+from app.models import Customer
+
+class CustomerSelectField(SelectField):
+    """Выбор клиента без загрузки всего списка клиентов.
+
+    Отрисовывается только выбранный клиент, остальные варианты браузер
+    подгружает из /customers/lookup. При проверке выполняется один запрос
+    по первичному ключу вместо сравнения со списком choices.
+    """
+    def __init__(self, label=None, validators=None, **kwargs):
+        kwargs.setdefault('coerce', int)
+        kwargs.setdefault('choices', [])
+        super(CustomerSelectField, self).__init__(label, validators, validate_choice=False, **kwargs)
+        self._customer = None
+    
+    def get_customer(self):
+        if self.data is None:
+            return None
+        if self._customer is None or self._customer.id != self.data:
+            self._customer = db.session.get(Customer, self.data)
+        return self._customer
+    
+    def iter_choices(self):
+        customer = self.get_customer()
+        self.choices = [(customer.id, customer.name)] if customer else []
+        return super(CustomerSelectField, self).iter_choices()
+    
+    def pre_validate(self, form):
+        if self.data is not None and self.get_customer() is None:
+            raise ValidationError('Выберите клиента из списка')
 
 class TaskForm(FlaskForm):
     title = StringField('Название задачи', validators=[
@@ -23,5 +54,5 @@ class TaskForm(FlaskForm):
         ('Завершена', 'Завершена'),
         ('Отложена', 'Отложена')
     ], default='Новая')
-    customer_id = SelectField('Клиент', coerce=int, validators=[DataRequired()])
+    customer_id = CustomerSelectField('Клиент', validators=[DataRequired()])
     submit = SubmitField('Сохранить') 
\ No newline at end of file
@@ -0,0 +1,202 @@
+from sqlalchemy import inspect, text, select, update, delete, func, MetaData
+from sqlalchemy.schema import CreateTable
+from app import db
+from app.models import (User, Customer, Contact, Task, StatCounter, SchemaMigration,
+                        TaskDailyStat, CustomerDailyStat, Watermark, Job, ReminderDigest)
+
+# Миграции схемы в порядке применения: (номер, описание, функция).
+# init-db создает схему целиком и сразу помечает все миграции примененными,
+# а flask db-upgrade доводит существующую базу до текущей схемы без потери данных.
+# Каждая миграция должна быть идемпотентной: повторный запуск ничего не ломает.
+MIGRATIONS = []
+
+def migration(version, description):
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        return f
+    return decorator
+
+def create_indexes(model, *names):
+    """Создает перечисленные индексы модели, если их еще нет в базе."""
+    connection = db.session.connection()
+    for index in model.__table__.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+def create_table(model):
+    model.__table__.create(db.session.connection(), checkfirst=True)
+
+def rebuild_sqlite_table(model):
+    """Пересоздает таблицу SQLite по текущему описанию модели, сохраняя данные.
+
+    SQLite не умеет менять внешние ключи через ALTER TABLE, поэтому создается
+    новая таблица, в нее копируются строки, старая удаляется, а новая переименовывается.
+    Индексы создаются заново; триггеры старой таблицы удаляются вместе с ней.
+    """
+    connection = db.session.connection()
+    quote = connection.dialect.identifier_preparer.quote
+    table = model.__table__
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    columns = ', '.join(quote(column.name) for column in table.columns if column.name in existing)
+
+    # Копия описания таблицы под новым именем; связанные таблицы нужны для внешних ключей
+    metadata = MetaData()
+    for referred in {fk.column.table for fk in table.foreign_keys}:
+        referred.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f'{table.name}_new')
+
+    connection.execute(CreateTable(new_table))
+    connection.execute(text(f'INSERT INTO {quote(new_table.name)} ({columns}) '
+                            f'SELECT {columns} FROM {quote(table.name)}'))
+    connection.execute(text(f'DROP TABLE {quote(table.name)}'))
+    connection.execute(text(f'ALTER TABLE {quote(new_table.name)} RENAME TO {quote(table.name)}'))
+    create_indexes(model, *(index.name for index in table.indexes))
+
+def replace_foreign_key(model, column_name):
+    """Пересоздает внешний ключ столбца с правилом ondelete из модели (PostgreSQL)."""
+    connection = db.session.connection()
+    quote = connection.dialect.identifier_preparer.quote
+    table = model.__table__
+    fk = next(iter(table.c[column_name].foreign_keys))
+    for existing in inspect(connection).get_foreign_keys(table.name):
+        if existing['constrained_columns'] == [column_name] and existing['name']:
+            connection.execute(text(f'ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(existing["name"])}'))
+    name = f'{table.name}_{column_name}_fkey'
+    connection.execute(text(
+        f'ALTER TABLE {quote(table.name)} ADD CONSTRAINT {quote(name)} '
+        f'FOREIGN KEY ({quote(column_name)}) '
+        f'REFERENCES {quote(fk.column.table.name)} ({quote(fk.column.name)}) ON DELETE {fk.ondelete}'))
+
+@migration(1, 'Таблица счетчиков клиентов и задач по статусам')
+def _stat_counters():
+    from app.services.counters import rebuild_counters
+    create_table(StatCounter)
+    rebuild_counters()
+
+@migration(2, 'Индекс (name, id) для списка клиентов')
+def _customer_name_index():
+    create_indexes(Customer, 'ix_customer_name_id')
+
+@migration(3, 'Полнотекстовый индекс клиентов и контактов')
+def _search_index():
+    from app.services.search import reindex
+    reindex()
+
+@migration(4, 'Индексы для дашборда, списка задач и страницы клиента')
+def _hot_query_indexes():
+    create_indexes(Customer, 'ix_customer_status', 'ix_customer_created_at')
+    create_indexes(Contact, 'ix_contact_customer_primary')
+    create_indexes(Task, 'ix_task_user_status_due', 'ix_task_user_due', 'ix_task_customer')
+
+@migration(5, 'Длина password_hash 256 символов для хэшей scrypt')
+def _password_hash_length():
+    connection = db.session.connection()
+    # SQLite не ограничивает длину VARCHAR, менять нужно только в остальных базах
+    if connection.dialect.name != 'sqlite':
+        connection.execute(text('ALTER TABLE "user" ALTER COLUMN password_hash TYPE VARCHAR(256)'))
+
+@migration(6, 'Индекс updated_at клиентов для ETag списка')
+def _customer_updated_index():
+    create_indexes(Customer, 'ix_customer_updated_at')
+
+@migration(7, 'Не больше одного основного контакта у клиента')
+def _single_primary_contact():
+    connection = db.session.connection()
+    if connection.dialect.name not in ('sqlite', 'postgresql'):
+        return
+    # Старый код мог оставить несколько основных контактов: оставляем самый ранний
+    first_primary = (select(func.min(Contact.id))
+                     .where(Contact.is_primary == True)
+                     .group_by(Contact.customer_id))
+    connection.execute(update(Contact)
+                       .where(Contact.is_primary == True, Contact.id.not_in(first_primary))
+                       .values(is_primary=False))
+    create_indexes(Contact, 'ux_contact_customer_primary')
+
+@migration(8, 'Каскадное удаление контактов и задач на стороне базы')
+def _cascade_deletes():
+    from app.services.counters import rebuild_counters
+    from app.services.search import rebuild_search_index
+    connection = db.session.connection()
+
+    # Строки без клиента или пользователя не пройдут проверку новых внешних ключей
+    existing_customers = select(Customer.id)
+    connection.execute(delete(Contact).where(Contact.customer_id.not_in(existing_customers)))
+    connection.execute(delete(Task).where(Task.customer_id.not_in(existing_customers)))
+    connection.execute(update(Task)
+                       .where(Task.user_id.is_not(None), Task.user_id.not_in(select(User.id)))
+                       .values(user_id=None))
+
+    if connection.dialect.name == 'sqlite':
+        rebuild_sqlite_table(Contact)
+        rebuild_sqlite_table(Task)
+        # Триггеры поиска удалены вместе со старой таблицей контактов
+        rebuild_search_index(connection)
+    else:
+        replace_foreign_key(Contact, 'customer_id')
+        replace_foreign_key(Task, 'customer_id')
+        replace_foreign_key(Task, 'user_id')
+    rebuild_counters()
+
+@migration(9, 'Индекс для сортировки списка задач по дате создания')
+def _task_created_index():
+    create_indexes(Task, 'ix_task_user_created')
+
+@migration(10, 'Индекс для постраничного списка задач клиента')
+def _customer_tasks_index():
+    create_indexes(Task, 'ix_task_customer_created')
+
+@migration(11, 'Покрывающие индексы задач для отчетов')
+def _report_indexes():
+    create_indexes(Task, 'ix_task_status_completed', 'ix_task_due_priority')
+
+@migration(12, 'Дневные итоги по задачам и клиентам для отчетов')
+def _daily_rollups():
+    create_table(TaskDailyStat)
+    create_table(CustomerDailyStat)
+    create_table(Watermark)
+
+@migration(13, 'Очередь фоновых задач')
+def _job_queue():
+    create_table(Job)
+
+@migration(14, 'Сводки напоминаний о сроках задач')
+def _reminder_digests():
+    create_table(ReminderDigest)
+
+def applied_versions():
+    return {version for (version,) in db.session.query(SchemaMigration.version)}
+
+def stamp():
+    """Помечает все миграции примененными (схема создана с нуля через create_all)."""
+    applied = applied_versions()
+    for version, description, _ in MIGRATIONS:
+        if version not in applied:
+            db.session.add(SchemaMigration(version=version, description=description))
+    db.session.commit()
+
+def upgrade():
+    """Применяет недостающие миграции и возвращает список [(номер, описание)]."""
+    if not inspect(db.engine).has_table(Customer.__tablename__):
+        # Пустая база: создаем схему целиком
+        db.create_all()
+        stamp()
+        return []
+
+    create_table(SchemaMigration)
+    db.session.commit()
+    applied = applied_versions()
+
+    done = []
+    for version, description, apply in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        try:
+            apply()
+            db.session.add(SchemaMigration(version=version, description=description))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        done.append((version, description))
+    return done
@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from app.services.passwords import get_hasher
 
 class Role:
     ADMIN = 'admin'  # Полный доступ ко всему
@@ -18,26 +18,8 @@ class Role:
             (cls.VIEWER, 'Наблюдатель')
         ]
 
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(64), index=True, unique=True, nullable=False)
-    email = db.Column(db.String(120), index=True, unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
-    role = db.Column(db.String(20), nullable=False, default=Role.EMPLOYEE)
-    first_name = db.Column(db.String(30))
-    last_name = db.Column(db.String(30))
-    position = db.Column(db.String(50))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_login = db.Column(db.DateTime)
-    
-    # Отношения
-    tasks = db.relationship('Task', backref='assigned_to', lazy='dynamic')
-    
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-        
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+class RoleMixin:
+    """Проверки прав по роли; общие для модели User и кэшированной UserIdentity."""
     
     def is_admin(self):
         return self.role == Role.ADMIN
@@ -73,11 +55,64 @@ class User(UserMixin, db.Model):
             if self.role == role_value:
                 return role_name
         return 'Неизвестно'
+
+class User(RoleMixin, UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(64), index=True, unique=True, nullable=False)
+    email = db.Column(db.String(120), index=True, unique=True, nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
+    role = db.Column(db.String(20), nullable=False, default=Role.EMPLOYEE)
+    first_name = db.Column(db.String(30))
+    last_name = db.Column(db.String(30))
+    position = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_login = db.Column(db.DateTime)
+    
+    # Отношения
+    tasks = db.relationship('Task', backref='assigned_to', lazy='dynamic')
+    
+    def set_password(self, password):
+        self.password_hash = get_hasher().hash(password)
+        
+    def check_password(self, password):
+        return get_hasher().verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        # Хэш создан с другим алгоритмом или стоимостью, чем в PASSWORD_HASH_METHOD
+        return get_hasher().needs_rehash(self.password_hash)
     
     def __repr__(self):
         return f'<User {self.username}>'
 
+class UserIdentity(RoleMixin, UserMixin):
+    """Снимок данных пользователя для current_user без обращения к базе.
+
+    Хранится в кэше загрузчика пользователей (app/services/identity.py).
+    Для изменения пользователя нужно загрузить модель User по id.
+    """
+    FIELDS = ('id', 'username', 'email', 'role', 'first_name', 'last_name', 'position', 'last_login')
+    
+    def __init__(self, **fields):
+        for field in self.FIELDS:
+            setattr(self, field, fields.get(field))
+    
+    @classmethod
+    def from_user(cls, user):
+        return cls(**{field: getattr(user, field) for field in cls.FIELDS})
+    
+    def __repr__(self):
+        return f'<UserIdentity {self.username}>'
+
 class Customer(db.Model):
+    __table_args__ = (
+        # Порядок списка клиентов и keyset-пагинация идут по (name, id)
+        db.Index('ix_customer_name_id', 'name', 'id'),
+        db.Index('ix_customer_status', 'status'),
+        db.Index('ix_customer_created_at', 'created_at'),
+        # Версия списка клиентов для условных GET-запросов
+        db.Index('ix_customer_updated_at', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     company = db.Column(db.String(100))
@@ -89,14 +124,32 @@ class Customer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Отношения
-    contacts = db.relationship('Contact', backref='customer', lazy='dynamic', cascade='all, delete-orphan')
-    tasks = db.relationship('Task', backref='customer', lazy='dynamic', cascade='all, delete-orphan')
+    # Отношения. Контакты и задачи удаляет сама база (ON DELETE CASCADE),
+    # не загружая их в сессию
+    contacts = db.relationship('Contact', backref='customer', lazy='dynamic',
+                               cascade='all, delete-orphan', passive_deletes=True)
+    # Основной контакт одним JOIN/SELECT, без загрузки всех контактов клиента
+    primary_contact = db.relationship('Contact',
+                                      primaryjoin='and_(Customer.id == Contact.customer_id, Contact.is_primary == True)',
+                                      uselist=False, viewonly=True)
+    tasks = db.relationship('Task', backref='customer', lazy='dynamic',
+                            cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<Customer {self.name}>'
 
 class Contact(db.Model):
+    __table_args__ = (
+        # Контакты клиента и поиск основного контакта
+        db.Index('ix_contact_customer_primary', 'customer_id', 'is_primary'),
+        # Не больше одного основного контакта у клиента, в том числе при параллельных правках.
+        # Частичные индексы есть только в SQLite и PostgreSQL; в остальных базах
+        # правило держится только на коде приложения
+        db.Index('ux_contact_customer_primary', 'customer_id', unique=True,
+                 sqlite_where=db.text('is_primary'),
+                 postgresql_where=db.text('is_primary')).ddl_if(dialect=('sqlite', 'postgresql')),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
@@ -109,12 +162,26 @@ class Contact(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Внешние ключи
-    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id', ondelete='CASCADE'), nullable=False)
     
     def __repr__(self):
         return f'<Contact {self.first_name} {self.last_name}>'
 
 class Task(db.Model):
+    __table_args__ = (
+        # Дашборд и список задач: задачи пользователя по статусу и сроку
+        db.Index('ix_task_user_status_due', 'user_id', 'status', 'due_date'),
+        db.Index('ix_task_user_due', 'user_id', 'due_date'),
+        # Список задач с сортировкой «сначала новые»
+        db.Index('ix_task_user_created', 'user_id', 'created_at'),
+        # Задачи на странице клиента
+        db.Index('ix_task_customer', 'customer_id'),
+        db.Index('ix_task_customer_created', 'customer_id', 'created_at'),
+        # Отчеты: покрывающие индексы, чтобы группировки не читали саму таблицу
+        db.Index('ix_task_status_completed', 'status', 'completed_at', 'user_id', 'created_at'),
+        db.Index('ix_task_due_priority', 'due_date', 'priority', 'status', 'completed_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
@@ -126,8 +193,151 @@ class Task(db.Model):
     completed_at = db.Column(db.DateTime)
     
     # Внешние ключи
-    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    
+    def __repr__(self):
+        return f'<Task {self.title}>'
+
+class StatCounter(db.Model):
+    """Материализованные счетчики записей по статусам.
+
+    Обновляются обработчиками событий сессии из app.services.counters,
+    поэтому дашборду не нужно пересчитывать таблицы на каждый запрос.
+    """
+    __tablename__ = 'stat_counter'
+    
+    CUSTOMER_STATUS = 'customer_status'  # Глобальные счетчики клиентов, owner_id = 0
+    TASK_STATUS = 'task_status'  # Счетчики задач пользователя, owner_id = user_id
+    
+    kind = db.Column(db.String(20), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True, default=0)
+    status = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StatCounter {self.kind}:{self.owner_id}:{self.status}={self.value}>'
+
+class TaskDailyStat(db.Model):
+    """Дневные итоги по задачам сотрудника в разрезе текущего статуса задачи.
+
+    created — задачи, созданные в этот день; completed — завершенные в этот день;
+    due — задачи со сроком в этот день, overdue — те из них, что завершены позже
+    срока или не завершены. Заполняется командой flask rollup (app.services.rollup).
+    """
+    __tablename__ = 'task_daily_stat'
+    
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 — задачи без исполнителя
+    status = db.Column(db.String(20), primary_key=True)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    due = db.Column(db.Integer, nullable=False, default=0)
+    overdue = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TaskDailyStat {self.day}:{self.user_id}:{self.status}>'
+
+class CustomerDailyStat(db.Model):
+    """Число клиентов, созданных за день, по текущему статусу клиента."""
+    __tablename__ = 'customer_daily_stat'
+    
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CustomerDailyStat {self.day}:{self.status}={self.created}>'
+
+class Watermark(db.Model):
+    """Отметка, до которой обработаны данные фоновой процедурой (например, 'rollup')."""
+    __tablename__ = 'watermark'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Watermark {self.name}={self.value}>'
+
+class Job(db.Model):
+    """Фоновая задача в очереди; выполняется процессом flask worker (см. app/services/jobs.py)."""
+    __tablename__ = 'job'
+    __table_args__ = (
+        # Выбор следующей задачи из очереди и поиск зависших
+        db.Index('ix_job_status_id', 'status', 'id'),
+        # Список задач пользователя
+        db.Index('ix_job_user', 'user_id', 'id'),
+    )
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    payload = db.Column(db.Text)  # JSON с аргументами обработчика
+    result = db.Column(db.Text)  # JSON с результатом
+    error = db.Column(db.Text)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    message = db.Column(db.String(200))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    user = db.relationship('User')
+    
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class ReminderDigest(db.Model):
+    """Сводка напоминаний о сроках задач для одного пользователя за одно окно планировщика.
+
+    items — JSON-список задач (id, название, клиент, срок, вид: due_soon или overdue);
+    в нем не больше REMINDER_ITEMS_LIMIT задач, а due_soon и overdue — полные количества.
+    """
+    __tablename__ = 'reminder_digest'
+    __table_args__ = (
+        # Сводки пользователя, новые первыми, и непрочитанные для дашборда
+        db.Index('ix_reminder_digest_user', 'user_id', 'id'),
+        # Сводки, которые еще нужно доставить
+        db.Index('ix_reminder_digest_delivered', 'delivered_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    window_start = db.Column(db.DateTime, nullable=False)
+    window_end = db.Column(db.DateTime, nullable=False)
+    due_soon = db.Column(db.Integer, nullable=False, default=0)
+    overdue = db.Column(db.Integer, nullable=False, default=0)
+    items = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime)
+    delivered_at = db.Column(db.DateTime)
+    delivery_attempts = db.Column(db.Integer, nullable=False, default=0)
+    delivery_error = db.Column(db.String(200))
+    
+    user = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<ReminderDigest {self.id} user={self.user_id}>'
+
+class SchemaMigration(db.Model):
+    """Примененные миграции схемы базы данных (см. app/migrations.py)."""
+    __tablename__ = 'schema_migration'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
-        return f'<Task {self.title}>' 
\ No newline at end of file
+        return f'<SchemaMigration {self.version}>' 
\ No newline at end of file
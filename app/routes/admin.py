@@ -0,0 +1,27 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app
+from flask_login import login_required
+from app.routes.auth import admin_required
+from app.services import metrics
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+@admin_bp.route('/metrics')
+@login_required
+@admin_required
+def metrics_view():
+    registry = metrics.get_registry()
+    return render_template('admin/metrics.html',
+                          title='Метрики запросов',
+                          enabled=registry is not None,
+                          rows=registry.summary() if registry is not None else [],
+                          slow_ms=current_app.config['METRICS_SLOW_REQUEST_MS'])
+
+@admin_bp.route('/metrics/reset', methods=['POST'])
+@login_required
+@admin_required
+def metrics_reset():
+    registry = metrics.get_registry()
+    if registry is not None:
+        registry.reset()
+        flash('Метрики сброшены.', 'success')
+    return redirect(url_for('admin.metrics_view'))
@@ -1,14 +1,18 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.urls import url_parse
 from datetime import datetime
 from app import db
 from app.models import User, Role
 from app.forms.auth import LoginForm, RegistrationForm, EditProfileForm, ChangePasswordForm, UserManagementForm
+from app.services.passwords import get_hasher, HasherBusy
 from functools import wraps
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+# Все потоки хэширования паролей заняты (см. app/services/passwords.py)
+BUSY_MESSAGE = 'Сервер перегружен, попробуйте через несколько секунд.'
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -35,13 +39,30 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            if user is None:
+                # Проверяем фиктивный хэш, чтобы по времени ответа нельзя было узнать, есть ли пользователь
+                valid = get_hasher().verify_dummy(form.password.data)
+            else:
+                valid = user.check_password(form.password.data)
+        except HasherBusy:
+            flash(BUSY_MESSAGE, 'warning')
+            return render_template('auth/login.html', title='Вход', form=form), 503
+        
+        if not valid:
             flash('Неверное имя пользователя или пароль', 'danger')
             return redirect(url_for('auth.login'))
         
         login_user(user, remember=form.remember_me.data)
         # Обновляем время последнего входа
         user.last_login = datetime.utcnow()
+        # Пароль известен только сейчас: перехэшируем его, если изменились параметры хэширования
+        if user.password_needs_rehash():
+            try:
+                user.set_password(form.password.data)
+            except HasherBusy:
+                # Вход уже состоялся; старый хэш остается рабочим, перехэшируем при следующем входе
+                current_app.logger.warning('Пароль пользователя %s не перехэширован: пул занят', user.id)
         db.session.commit()
         
         next_page = request.args.get('next')
@@ -73,7 +94,11 @@ def register():
             position=form.position.data,
             role=Role.EMPLOYEE  # По умолчанию регистрация даёт роль сотрудника
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HasherBusy:
+            form.password.errors.append(BUSY_MESSAGE)
+            return render_template('auth/register.html', title='Регистрация', form=form), 503
         db.session.add(user)
         db.session.commit()
         flash('Поздравляем, вы зарегистрированы! Теперь вы можете войти в систему.', 'success')
@@ -88,11 +113,13 @@ def profile():
     password_form = ChangePasswordForm()
     
     if form.validate_on_submit():
-        current_user.username = form.username.data
-        current_user.email = form.email.data
-        current_user.first_name = form.first_name.data
-        current_user.last_name = form.last_name.data
-        current_user.position = form.position.data
+        # current_user — кэшированный снимок, изменяем саму запись в базе
+        user = db.session.get(User, current_user.id)
+        user.username = form.username.data
+        user.email = form.email.data
+        user.first_name = form.first_name.data
+        user.last_name = form.last_name.data
+        user.position = form.position.data
         db.session.commit()
         flash('Ваш профиль успешно обновлен!', 'success')
         return redirect(url_for('auth.profile'))
@@ -112,11 +139,16 @@ def profile():
 def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
-        if not current_user.check_password(form.current_password.data):
-            flash('Неверный текущий пароль', 'danger')
+        user = db.session.get(User, current_user.id)
+        try:
+            if not user.check_password(form.current_password.data):
+                flash('Неверный текущий пароль', 'danger')
+                return redirect(url_for('auth.profile'))
+            user.set_password(form.new_password.data)
+        except HasherBusy:
+            flash(BUSY_MESSAGE, 'warning')
             return redirect(url_for('auth.profile'))
         
-        current_user.set_password(form.new_password.data)
         db.session.commit()
         flash('Ваш пароль успешно изменен!', 'success')
         return redirect(url_for('auth.profile'))
@@ -154,11 +186,15 @@ def add_user():
             role=form.role.data
         )
         
-        if form.password.data:
-            user.set_password(form.password.data)
-        else:
-            # Устанавливаем стандартный пароль, который нужно будет изменить
-            user.set_password('password123')
+        try:
+            if form.password.data:
+                user.set_password(form.password.data)
+            else:
+                # Устанавливаем стандартный пароль, который нужно будет изменить
+                user.set_password('password123')
+        except HasherBusy:
+            form.password.errors.append(BUSY_MESSAGE)
+            return render_template('auth/user_form.html', title='Добавление пользователя', form=form), 503
         
         db.session.add(user)
         db.session.commit()
@@ -193,7 +229,13 @@ def edit_user(id):
         user.role = form.role.data
         
         if form.password.data:
-            user.set_password(form.password.data)
+            try:
+                user.set_password(form.password.data)
+            except HasherBusy:
+                db.session.rollback()
+                form.password.errors.append(BUSY_MESSAGE)
+                return render_template('auth/user_form.html', title='Редактирование пользователя',
+                                       form=form, user=user), 503
         
         db.session.commit()
         flash(f'Данные пользователя {user.username} успешно обновлены!', 'success')
@@ -207,7 +249,7 @@ def edit_user(id):
 def delete_user(id):
     user = User.query.get_or_404(id)
     
-    if user == current_user:
+    if user.id == current_user.id:
         flash('Вы не можете удалить свою учетную запись.', 'danger')
         return redirect(url_for('auth.users_list'))
     
@@ -1,20 +1,131 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
-from flask_login import login_required
+import os
+import uuid
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, abort
+from flask_login import login_required, current_user
+from markupsafe import Markup
+from sqlalchemy import select, func, update, true
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, joinedload
 from app import db
-from app.models import Customer, Contact
-from app.forms.customer import CustomerForm, ContactForm
+from app.models import Customer, Contact, Task, StatCounter
+from app.forms.customer import CustomerForm, ContactForm, ImportForm
+from app.routes.auth import manager_required
+from app.services import importer, exporter, fragments
+from app.services.customers import delete_customers
+from app.services import jobs
+from app.routes.jobs import enqueue_and_redirect
+from app.services.pagination import keyset_paginate, fill_total
+from app.services.conditional import conditional_get
+from app.services import search as search_service
+from datetime import datetime
 
 customer_bp = Blueprint('customer', __name__, url_prefix='/customers')
 
+# Количество клиентов на странице списка
+CUSTOMERS_PER_PAGE = 10
+
+# Количество подсказок в одном ответе /customers/lookup
+LOOKUP_PER_PAGE = 20
+
+# Размер одной порции контактов и задач на странице клиента
+CONTACTS_PER_PAGE = 20
+CUSTOMER_TASKS_PER_PAGE = 20
+
+# Вкладки списка задач на странице клиента: подпись и условие
+TASK_PANELS = {
+    'open': ('Открытые', Task.status != 'Завершена'),
+    'done': ('Завершенные', Task.status == 'Завершена'),
+    'all': ('Все', true()),
+}
+
+def _index_version():
+    # Последнее изменение (по индексу) и число клиентов из счетчиков: удаление тоже меняет версию
+    total = select(func.sum(StatCounter.value)).where(
+        StatCounter.kind == StatCounter.CUSTOMER_STATUS).scalar_subquery()
+    return tuple(db.session.execute(select(func.max(Customer.updated_at), total)).one())
+
+def _view_version(id):
+    columns = [Customer.updated_at]
+    for model in (Contact, Task):
+        columns.append(select(func.max(model.updated_at)).where(model.customer_id == id).scalar_subquery())
+        columns.append(select(func.count()).where(model.customer_id == id).scalar_subquery())
+    row = db.session.execute(select(*columns).where(Customer.id == id)).first()
+    return tuple(row) if row is not None else None
+
 @customer_bp.route('/')
 @login_required
+@conditional_get(_index_version)
 def index():
-    page = request.args.get('page', 1, type=int)
-    customers = Customer.query.order_by(Customer.name).paginate(
-        page=page, per_page=10, error_out=False)
+    page = request.args.get('page', type=int)
+    order = (Customer.name, Customer.id)
+    # Основные контакты страницы подгружаем одним дополнительным запросом
+    query = Customer.query.options(selectinload(Customer.primary_contact))
+    
+    if page:
+        # Старый режим с номерами страниц (OFFSET + COUNT)
+        customers = query.order_by(*order).paginate(
+            page=page, per_page=CUSTOMERS_PER_PAGE, error_out=False)
+    else:
+        # Keyset-пагинация по (name, id) с курсорами на соседние страницы
+        customers = keyset_paginate(query, order, CUSTOMERS_PER_PAGE,
+                                    after=request.args.get('after'),
+                                    before=request.args.get('before'))
+        fill_total(customers, Customer.query, Customer, current_app.config['PAGINATION_TOTAL'])
+    
     return render_template('customer/index.html', 
                          title='Клиенты',
-                         customers=customers)
+                         customers=customers,
+                         keyset=not page)
+
+@customer_bp.route('/search')
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    customers = search_service.search_customers(query)
+    contacts = search_service.search_contacts(query)
+    
+    return render_template('customer/search.html',
+                         title='Поиск клиентов',
+                         query=query,
+                         customers=customers,
+                         contacts=contacts)
+
+@customer_bp.route('/lookup')
+@login_required
+def lookup():
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    rows, has_more = search_service.lookup_customers(query, page, LOOKUP_PER_PAGE)
+    
+    return jsonify(results=[{'id': row.id, 'text': row.name, 'company': row.company} for row in rows],
+                   page=page,
+                   has_more=has_more)
+
+@customer_bp.route('/export')
+@login_required
+@manager_required
+def export():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        abort(400)
+    filters = {'status': request.args.get('status') or None}
+    if request.args.get('background'):
+        return enqueue_and_redirect('export', {'entity': 'customers', 'fmt': fmt, 'filters': filters},
+                                    'Выгрузка клиентов поставлена в очередь.')
+    return exporter.export_response('customers', fmt, **filters)
+
+@customer_bp.route('/contacts/export')
+@login_required
+@manager_required
+def export_contacts():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        abort(400)
+    filters = {'customer_id': request.args.get('customer', type=int)}
+    if request.args.get('background'):
+        return enqueue_and_redirect('export', {'entity': 'contacts', 'fmt': fmt, 'filters': filters},
+                                    'Выгрузка контактов поставлена в очередь.')
+    return exporter.export_response('contacts', fmt, **filters)
 
 @customer_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -39,6 +150,28 @@ def add():
                          title='Добавить клиента',
                          form=form)
 
+@customer_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@manager_required
+def import_customers():
+    form = ImportForm()
+    
+    if form.validate_on_submit():
+        try:
+            fmt = importer.detect_format(form.file.data.filename)
+        except importer.ImportFormatError as e:
+            flash(str(e), 'danger')
+        else:
+            # Файл сохраняем под своим именем: импорт выполнит flask worker
+            path = os.path.join(jobs.files_dir(), f'upload-{uuid.uuid4().hex}.{fmt}')
+            form.file.data.save(path)
+            return enqueue_and_redirect('import-customers', {'path': path, 'fmt': fmt},
+                                        'Импорт поставлен в очередь.')
+    
+    return render_template('customer/import.html',
+                         title='Импорт клиентов',
+                         form=form)
+
 @customer_bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit(id):
@@ -57,27 +190,132 @@ def edit(id):
 
 @customer_bp.route('/<int:id>')
 @login_required
+@conditional_get(_view_version)
 def view(id):
-    customer = Customer.query.get_or_404(id)
-    contacts = customer.contacts.all()
-    tasks = customer.tasks.all()
-    
+    panel = request.args.get('tasks', 'open')
+    if panel not in TASK_PANELS:
+        panel = 'open'
+
+    def render():
+        customer = Customer.query.get_or_404(id)
+        task_counts = _task_status_counts(id)
+        content = render_template('customer/_view_content.html',
+                                  customer=customer,
+                                  contacts=_contacts_page(id),
+                                  tasks=_tasks_page(id, panel),
+                                  panel=panel,
+                                  panels=TASK_PANELS,
+                                  task_counts=task_counts,
+                                  panel_counts=_panel_counts(task_counts))
+        return {'title': customer.name, 'content': content}
+
+    # Ссылки на редактирование задач зависят от пользователя, поэтому он входит в ключ
+    fragment = fragments.cached(f'customer-view:{id}:{current_user.id}:{panel}',
+                                fragments.customer_versions(id), render)
     return render_template('customer/view.html',
-                         title=customer.name,
-                         customer=customer,
-                         contacts=contacts,
-                         tasks=tasks)
+                         title=fragment['title'],
+                         content=Markup(fragment['content']))
+
+@customer_bp.route('/<int:id>/contacts')
+@login_required
+@conditional_get(_view_version)
+def contacts(id):
+    Customer.query.get_or_404(id)
+    page = _contacts_page(id, request.args.get('after'))
+    html = render_template('customer/_contact_items.html', contacts=page)
+    return _panel_response(html, page, 'customer.contacts', id=id)
+
+@customer_bp.route('/<int:id>/tasks')
+@login_required
+@conditional_get(_view_version)
+def tasks(id):
+    Customer.query.get_or_404(id)
+    panel = request.args.get('tasks', 'open')
+    if panel not in TASK_PANELS:
+        abort(400)
+    page = _tasks_page(id, panel, request.args.get('after'))
+    html = render_template('customer/_task_rows.html', tasks=page)
+    return _panel_response(html, page, 'customer.tasks', id=id, tasks=panel)
+
+def _contacts_page(customer_id, after=None):
+    # Основной контакт первым, остальные — от новых к старым.
+    # Столбец is_primary допускает NULL (например, строки, вставленные в обход приложения)
+    query = Contact.query.filter_by(customer_id=customer_id)
+    return keyset_paginate(query, (Contact.is_primary, Contact.id), CONTACTS_PER_PAGE,
+                           after=after, descending=True, nullable=True)
+
+def _tasks_page(customer_id, panel, after=None):
+    query = Task.query.options(joinedload(Task.assigned_to)) \
+        .filter(Task.customer_id == customer_id, TASK_PANELS[panel][1])
+    return keyset_paginate(query, (Task.created_at, Task.id), CUSTOMER_TASKS_PER_PAGE,
+                           after=after, descending=True)
+
+def _task_status_counts(customer_id):
+    """Число задач клиента по статусам одним сгруппированным запросом."""
+    return dict(db.session.execute(
+        select(Task.status, func.count())
+        .where(Task.customer_id == customer_id)
+        .group_by(Task.status)).all())
+
+def _panel_counts(task_counts):
+    total = sum(task_counts.values())
+    done = task_counts.get('Завершена', 0)
+    return {'open': total - done, 'done': done, 'all': total}
+
+def _panel_response(html, page, endpoint, **url_args):
+    """Очередная порция списка: HTML строк и адрес следующей порции."""
+    next_url = url_for(endpoint, after=page.next_cursor, **url_args) if page.has_next else None
+    return jsonify(html=html, next=next_url)
 
 @customer_bp.route('/<int:id>/delete', methods=['POST'])
 @login_required
 def delete(id):
-    customer = Customer.query.get_or_404(id)
-    db.session.delete(customer)
-    db.session.commit()
+    # Контакты и задачи удаляет база, без загрузки в сессию
+    if not delete_customers([id]):
+        abort(404)
     flash('Клиент удален!', 'success')
     return redirect(url_for('customer.index'))
 
+@customer_bp.route('/bulk-delete', methods=['POST'])
+@login_required
+@manager_required
+def bulk_delete():
+    ids = request.form.getlist('ids', type=int)
+    if not ids:
+        flash('Не выбрано ни одного клиента.', 'warning')
+        return redirect(url_for('customer.index'))
+    
+    # Вместе с клиентами удаляются все их контакты и задачи, поэтому удаление идет в фоне
+    return enqueue_and_redirect('delete-customers', {'ids': ids},
+                                f'Удаление клиентов ({len(ids)}) поставлено в очередь.')
+
 # Контакты клиента
+def _reset_primary(customer_id, keep_id=None):
+    """Снимает отметку основного контакта у остальных контактов клиента одним UPDATE.
+
+    Вызывается до того, как новый основной контакт попадет в базу, иначе
+    уникальный индекс ux_contact_customer_primary увидит два основных контакта.
+    """
+    query = update(Contact).where(Contact.customer_id == customer_id, Contact.is_primary == True)
+    if keep_id is not None:
+        query = query.where(Contact.id != keep_id)
+    with db.session.no_autoflush:
+        db.session.execute(query.values(is_primary=False))
+
+def _touch_customer(customer):
+    # Основной контакт выводится в списке клиентов, а его ETag считается по updated_at клиентов
+    customer.updated_at = datetime.utcnow()
+
+def _commit_contact():
+    """Фиксирует изменения контакта; False, если параллельно назначили другой основной контакт."""
+    try:
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        flash('Другой пользователь одновременно изменил основной контакт клиента. Повторите сохранение.', 'danger')
+        return False
+
 @customer_bp.route('/<int:customer_id>/contacts/add', methods=['GET', 'POST'])
 @login_required
 def add_contact(customer_id):
@@ -98,13 +336,13 @@ def add_contact(customer_id):
         
         if contact.is_primary:
             # Сбрасываем первичный контакт для других контактов этого клиента
-            for c in customer.contacts.all():
-                c.is_primary = False
+            _reset_primary(customer.id)
+            _touch_customer(customer)
         
         db.session.add(contact)
-        db.session.commit()
-        flash('Контакт добавлен!', 'success')
-        return redirect(url_for('customer.view', id=customer.id))
+        if _commit_contact():
+            flash('Контакт добавлен!', 'success')
+            return redirect(url_for('customer.view', id=customer.id))
     
     return render_template('customer/contact_form.html',
                          title=f'Добавить контакт для {customer.name}',
@@ -119,18 +357,16 @@ def edit_contact(id):
     form = ContactForm(obj=contact)
     
     if form.validate_on_submit():
-        was_primary = contact.is_primary
-        form.populate_obj(contact)
-        
-        if contact.is_primary and not was_primary:
+        if form.is_primary.data and not contact.is_primary:
             # Сбрасываем первичный контакт для других контактов этого клиента
-            for c in customer.contacts.all():
-                if c.id != contact.id:
-                    c.is_primary = False
+            _reset_primary(customer.id, keep_id=contact.id)
+        if form.is_primary.data or contact.is_primary:
+            _touch_customer(customer)
+        form.populate_obj(contact)
         
-        db.session.commit()
-        flash('Контакт обновлен!', 'success')
-        return redirect(url_for('customer.view', id=customer.id))
+        if _commit_contact():
+            flash('Контакт обновлен!', 'success')
+            return redirect(url_for('customer.view', id=customer.id))
     
     return render_template('customer/contact_form.html',
                          title=f'Редактировать контакт {contact.first_name} {contact.last_name}',
@@ -142,6 +378,8 @@ def edit_contact(id):
 def delete_contact(id):
     contact = Contact.query.get_or_404(id)
     customer_id = contact.customer_id
+    if contact.is_primary:
+        _touch_customer(contact.customer)
     db.session.delete(contact)
     db.session.commit()
     flash('Контакт удален!', 'success')
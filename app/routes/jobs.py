@@ -0,0 +1,77 @@
+import os
+from flask import Blueprint, render_template, jsonify, abort, send_from_directory, flash, redirect, url_for
+from flask_login import login_required, current_user
+from app import db
+from app.models import Job
+from app.services import jobs
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+# Сколько последних задач показывать в списке
+JOBS_PER_PAGE = 50
+
+def _get_job(id):
+    job = db.session.get(Job, id)
+    if job is None:
+        abort(404)
+    # Задачу видит тот, кто ее поставил, и администраторы
+    if job.user_id != current_user.id and not current_user.is_admin():
+        abort(403)
+    return job
+
+def enqueue_and_redirect(kind, payload, message):
+    """Ставит задачу в очередь от имени текущего пользователя и ведет на страницу ее хода."""
+    job = jobs.enqueue(kind, payload, current_user)
+    flash(message, 'info')
+    return redirect(url_for('jobs.view', id=job.id))
+
+def job_status(job):
+    """Состояние задачи для JSON-ответов и опроса со страницы."""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'error': job.error,
+        'result': jobs.result_of(job),
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+
+@jobs_bp.route('/')
+@login_required
+def index():
+    query = Job.query.order_by(Job.id.desc())
+    if not current_user.is_admin():
+        query = query.filter(Job.user_id == current_user.id)
+    return render_template('jobs/index.html',
+                          title='Фоновые задачи',
+                          jobs=query.limit(JOBS_PER_PAGE).all(),
+                          labels=jobs.KIND_LABELS)
+
+@jobs_bp.route('/<int:id>')
+@login_required
+def view(id):
+    job = _get_job(id)
+    return render_template('jobs/view.html',
+                          title=jobs.KIND_LABELS.get(job.kind, job.kind),
+                          job=job,
+                          result=jobs.result_of(job))
+
+@jobs_bp.route('/<int:id>/status')
+@login_required
+def status(id):
+    return jsonify(job_status(_get_job(id)))
+
+@jobs_bp.route('/<int:id>/download')
+@login_required
+def download(id):
+    job = _get_job(id)
+    name = jobs.result_of(job).get('file')
+    if job.status != Job.DONE or not name:
+        abort(404)
+    # Имя файла начинается с id задачи; send_from_directory не выпустит за пределы каталога
+    return send_from_directory(os.path.abspath(jobs.files_dir()), name, as_attachment=True,
+                               download_name=name.split('-', 1)[1])
@@ -0,0 +1,25 @@
+from flask import Blueprint, render_template, flash, redirect, url_for
+from flask_login import login_required, current_user
+from app.models import ReminderDigest
+from app.services import reminders
+
+reminders_bp = Blueprint('reminders', __name__, url_prefix='/reminders')
+
+# Сколько последних сводок показывать
+DIGESTS_PER_PAGE = 30
+
+@reminders_bp.route('/')
+@login_required
+def index():
+    digests = ReminderDigest.query.filter_by(user_id=current_user.id) \
+        .order_by(ReminderDigest.id.desc()).limit(DIGESTS_PER_PAGE).all()
+    return render_template('reminders/index.html',
+                          title='Напоминания',
+                          digests=[(digest, reminders.items_of(digest)) for digest in digests])
+
+@reminders_bp.route('/read', methods=['POST'])
+@login_required
+def mark_read():
+    if reminders.mark_read(current_user.id):
+        flash('Напоминания отмечены как прочитанные.', 'success')
+    return redirect(url_for('reminders.index'))
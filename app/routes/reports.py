@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, request, flash, jsonify
+from flask_login import login_required
+from app.routes.auth import manager_required
+from app.services.reports import build_report
+from app.services import rollup
+from app.routes.jobs import enqueue_and_redirect
+
+reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
+
+# Период по умолчанию — последний год
+DEFAULT_PERIOD_DAYS = 365
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+@reports_bp.route('/')
+@login_required
+@manager_required
+def index():
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    date_to = _parse_date(request.args.get('date_to', '')) or today
+    date_from = _parse_date(request.args.get('date_from', '')) or date_to - timedelta(days=DEFAULT_PERIOD_DAYS)
+    if date_from > date_to:
+        flash('Начало периода позже его конца, даты переставлены.', 'warning')
+        date_from, date_to = date_to, date_from
+
+    # Дата «по» включительно
+    report = build_report(date_from, date_to + timedelta(days=1))
+    if request.args.get('format') == 'json':
+        return jsonify(date_from=date_from.strftime('%Y-%m-%d'), date_to=date_to.strftime('%Y-%m-%d'), **report)
+
+    return render_template('reports/index.html',
+                          title='Отчеты',
+                          report=report,
+                          date_from=date_from,
+                          date_to=date_to,
+                          rollup_done=rollup.watermark())
+
+@reports_bp.route('/rollup', methods=['POST'])
+@login_required
+@manager_required
+def run_rollup():
+    return enqueue_and_redirect('rollup', {}, 'Пересчет дневных итогов поставлен в очередь.')
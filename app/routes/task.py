@@ -1,37 +1,111 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy import select, func, case, and_
+from sqlalchemy.orm import joinedload
 from app import db
-from app.models import Task, Customer
+from app.models import Task, Customer, User
 from app.forms.task import TaskForm
+from app.services import exporter
+from app.services.tasks import (bulk_update, BulkTaskError, parse_task_filters, filter_tasks,
+                               task_facets, TASK_SORTS, TASK_STATUSES, TASK_PRIORITIES)
+from app.services.pagination import keyset_paginate
+from app.routes.jobs import enqueue_and_redirect
+from app.services.conditional import conditional_get
 from datetime import datetime
 
 task_bp = Blueprint('task', __name__, url_prefix='/tasks')
 
+# Размер страницы списка задач
+TASKS_PER_PAGE = 50
+
+def _index_version():
+    # Список показывает имена клиентов и отметку о просрочке, зависящую от текущего времени
+    overdue = func.sum(case((and_(Task.due_date < datetime.utcnow(), Task.status != 'Завершена'), 1), else_=0))
+    query = (select(func.max(Task.updated_at), func.max(Customer.updated_at), func.count(), overdue)
+             .join_from(Task, Customer)
+             .where(Task.user_id == current_user.id))
+    return tuple(db.session.execute(query).one())
+
+def _view_version(id):
+    row = db.session.execute(
+        select(Task.updated_at, Customer.updated_at).join_from(Task, Customer).where(Task.id == id)).first()
+    return tuple(row) if row is not None else None
+
+def _filter_args(filters):
+    """Параметры текущих фильтров для ссылок пагинации и фасетов."""
+    args = {
+        'status': filters['status'],
+        'priority': filters['priority'],
+        'customer': filters['customer'],
+        'due_from': filters['due_from'].strftime('%Y-%m-%d') if filters['due_from'] else None,
+        'due_to': filters['due_to'].strftime('%Y-%m-%d') if filters['due_to'] else None,
+        'overdue': '1' if filters['overdue'] else None,
+        'sort': filters['sort'] if filters['sort'] != 'due' else None,
+    }
+    return {key: value for key, value in args.items() if value}
+
 @task_bp.route('/')
 @login_required
+@conditional_get(_index_version)
 def index():
-    status_filter = request.args.get('status', '')
-    if status_filter:
-        tasks = Task.query.filter_by(
-            user_id=current_user.id,
-            status=status_filter
-        ).order_by(Task.due_date.asc()).all()
-    else:
-        tasks = Task.query.filter_by(
-            user_id=current_user.id
-        ).order_by(Task.due_date.asc()).all()
+    now = datetime.utcnow()
+    filters = parse_task_filters(request.args)
+    _, order, descending, nullable = TASK_SORTS[filters['sort']]
+    # Клиента подгружаем тем же запросом, чтобы не делать SELECT на каждую строку
+    query = filter_tasks(Task.query.options(joinedload(Task.customer)), current_user.id, filters, now)
+    tasks = keyset_paginate(query, order, TASKS_PER_PAGE,
+                            after=request.args.get('after'),
+                            before=request.args.get('before'),
+                            descending=descending, nullable=nullable)
+    facets = task_facets(current_user.id, filters, now)
+    customer = db.session.get(Customer, filters['customer']) if filters['customer'] else None
+    # Список сотрудников нужен только менеджерам для передачи задач
+    users = User.query.order_by(User.username).all() if current_user.is_manager() else []
     
     return render_template('task/index.html',
                           title='Мои задачи',
                           tasks=tasks,
-                          status_filter=status_filter)
+                          users=users,
+                          filters=filters,
+                          filter_args=_filter_args(filters),
+                          facets=facets,
+                          customer=customer,
+                          statuses=TASK_STATUSES,
+                          priorities=TASK_PRIORITIES,
+                          sorts=TASK_SORTS,
+                          now=now)
+
+@task_bp.route('/export')
+@login_required
+def export():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        abort(400)
+    
+    # По умолчанию выгружаем свои задачи; задачи других пользователей доступны менеджерам
+    user = request.args.get('user', '')
+    if user and user != str(current_user.id) and not current_user.is_manager():
+        abort(403)
+    if user == 'all':
+        user_id = None
+    elif user:
+        try:
+            user_id = int(user)
+        except ValueError:
+            abort(400)
+    else:
+        user_id = current_user.id
+    
+    filters = {'status': request.args.get('status') or None, 'user_id': user_id}
+    if request.args.get('background'):
+        return enqueue_and_redirect('export', {'entity': 'tasks', 'fmt': fmt, 'filters': filters},
+                                    'Выгрузка задач поставлена в очередь.')
+    return exporter.export_response('tasks', fmt, **filters)
 
 @task_bp.route('/add', methods=['GET', 'POST'])
 @login_required
 def add():
     form = TaskForm()
-    # Заполняем поле выбора клиента
-    form.customer_id.choices = [(c.id, c.name) for c in Customer.query.order_by(Customer.name).all()]
     
     if form.validate_on_submit():
         task = Task(
@@ -62,7 +136,6 @@ def edit(id):
         return redirect(url_for('task.index'))
     
     form = TaskForm(obj=task)
-    form.customer_id.choices = [(c.id, c.name) for c in Customer.query.order_by(Customer.name).all()]
     
     if form.validate_on_submit():
         form.populate_obj(task)
@@ -76,6 +149,7 @@ def edit(id):
 
 @task_bp.route('/<int:id>')
 @login_required
+@conditional_get(_view_version)
 def view(id):
     task = Task.query.get_or_404(id)
     # Проверяем, принадлежит ли задача текущему пользователю
@@ -114,4 +188,37 @@ def complete(id):
     task.completed_at = datetime.utcnow()
     db.session.commit()
     flash('Задача отмечена как завершенная!', 'success')
-    return redirect(url_for('task.index')) 
\ No newline at end of file
+    return redirect(url_for('task.index'))
+
+@task_bp.route('/bulk', methods=['POST'])
+@login_required
+def bulk():
+    """Массовые действия с задачами: форма списка задач или JSON {ids, action, value}."""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        try:
+            ids = [int(task_id) for task_id in data.get('ids', [])]
+        except (TypeError, ValueError):
+            abort(400)
+        action, value = data.get('action', ''), data.get('value')
+    else:
+        ids = request.form.getlist('ids', type=int)
+        # Статус и приоритет приходят вместе с действием: "status:Отложена"
+        action, _, value = request.form.get('action', '').partition(':')
+        if action == 'shift_due':
+            value = request.form.get('days')
+        elif action == 'reassign':
+            value = request.form.get('user_id')
+    
+    try:
+        count = bulk_update(ids, action, value, current_user)
+    except BulkTaskError as e:
+        if request.is_json:
+            return jsonify(error=str(e)), 400
+        flash(str(e), 'danger')
+        return redirect(url_for('task.index'))
+    
+    if request.is_json:
+        return jsonify(updated=count)
+    flash(f'Обработано задач: {count}.', 'success')
+    return redirect(url_for('task.index'))
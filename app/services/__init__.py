@@ -0,0 +1 @@
+# Пустой файл инициализации для пакета services 
\ No newline at end of file
@@ -0,0 +1,61 @@
+import hashlib
+import os
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+def init_app(app):
+    # Метка версии шаблонов: после выкладки новых шаблонов старые ETag не подходят
+    app.config.setdefault('ETAG_SALT', str(_templates_mtime(app)))
+
+def _templates_mtime(app):
+    latest = 0
+    for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for name in files:
+            latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+    return int(latest)
+
+def _etag(values):
+    # Страницы зависят от пользователя: имя в шапке, роль, ссылки на свои задачи
+    user = (current_user.id, current_user.role, current_user.username)
+    parts = (values, user, request.full_path, current_app.config.get('ETAG_SALT', ''))
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+def conditional_get(validator):
+    """Отвечает 304 Not Modified, если страница не менялась с прошлого запроса браузера.
+
+    validator(**view_args) одним легким запросом возвращает кортеж значений,
+    от которых зависит страница (max(updated_at), число строк и т.п.), или None,
+    если проверку нужно пропустить (например, записи нет и представление вернет 404).
+    ETag считается из этих значений, пользователя и адреса страницы и проверяется
+    до загрузки сущностей и рендеринга шаблона.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Непоказанные flash-сообщения выводятся в шаблоне, такой ответ кэшировать нельзя
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            values = validator(**kwargs)
+            if values is None:
+                return f(*args, **kwargs)
+
+            etag = _etag(values)
+            # Last-Modified не отдаем: дата одна не отражает удалений, счетчиков, пользователя
+            # и адреса, а клиент с одним If-Modified-Since получил бы 304 на измененную страницу
+            if not is_resource_modified(request.environ, etag=etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # Браузер хранит копию, но перед показом всегда сверяет ее с сервером
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
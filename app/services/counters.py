@@ -0,0 +1,162 @@
+from collections import Counter
+from sqlalchemy import event, func, delete, insert, select, literal, inspect
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Customer, Task, StatCounter
+
+# Ключ в session.info, где копятся изменения счетчиков до конца flush
+_DELTAS_KEY = 'stat_counter_deltas'
+
+# Диалекты, которые умеют INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def _status_key(status):
+    # Статус входит в первичный ключ счетчика, поэтому NULL заменяем пустой строкой
+    return status or ''
+
+def _persisted_value(target, attr):
+    """Значение атрибута, которое сейчас лежит в базе (до изменений в этом flush)."""
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(target, attr)
+
+def _deltas(target):
+    session = inspect(target).session
+    return session.info.setdefault(_DELTAS_KEY, Counter())
+
+def _customer_key(status):
+    return (StatCounter.CUSTOMER_STATUS, 0, _status_key(status))
+
+def task_key(user_id, status):
+    """Ключ счетчика задач пользователя в данном статусе (для массовых операций)."""
+    return (StatCounter.TASK_STATUS, user_id or 0, _status_key(status))
+
+@event.listens_for(Customer, 'after_insert')
+def _customer_inserted(mapper, connection, target):
+    _deltas(target)[_customer_key(target.status)] += 1
+
+@event.listens_for(Customer, 'after_update')
+def _customer_updated(mapper, connection, target):
+    old_status = _persisted_value(target, 'status')
+    if old_status != target.status:
+        deltas = _deltas(target)
+        deltas[_customer_key(old_status)] -= 1
+        deltas[_customer_key(target.status)] += 1
+
+@event.listens_for(Customer, 'after_delete')
+def _customer_deleted(mapper, connection, target):
+    _deltas(target)[_customer_key(_persisted_value(target, 'status'))] -= 1
+
+@event.listens_for(Task, 'after_insert')
+def _task_inserted(mapper, connection, target):
+    _deltas(target)[task_key(target.user_id, target.status)] += 1
+
+@event.listens_for(Task, 'after_update')
+def _task_updated(mapper, connection, target):
+    old_key = task_key(_persisted_value(target, 'user_id'), _persisted_value(target, 'status'))
+    new_key = task_key(target.user_id, target.status)
+    if old_key != new_key:
+        deltas = _deltas(target)
+        deltas[old_key] -= 1
+        deltas[new_key] += 1
+
+@event.listens_for(Task, 'after_delete')
+def _task_deleted(mapper, connection, target):
+    key = task_key(_persisted_value(target, 'user_id'), _persisted_value(target, 'status'))
+    _deltas(target)[key] -= 1
+
+@event.listens_for(Session, 'before_flush')
+def _reset_deltas(session, flush_context, instances):
+    # Изменения от неудавшегося flush не должны попасть в следующий
+    session.info.pop(_DELTAS_KEY, None)
+
+@event.listens_for(Session, 'after_flush')
+def _apply_deltas(session, flush_context):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+def customer_deltas_for(*criteria):
+    """Изменения счетчиков при удалении клиентов, подходящих под условия, одним GROUP BY."""
+    deltas = Counter()
+    rows = db.session.execute(select(Customer.status, func.count())
+                              .where(*criteria).group_by(Customer.status))
+    for status, count in rows:
+        deltas[_customer_key(status)] -= count
+    return deltas
+
+def task_deltas_for(*criteria):
+    """Изменения счетчиков при удалении задач, подходящих под условия, одним GROUP BY.
+
+    Нужна массовым операциям и каскадному удалению на стороне базы,
+    которые не вызывают событий ORM.
+    """
+    deltas = Counter()
+    rows = db.session.execute(select(Task.user_id, Task.status, func.count())
+                              .where(*criteria).group_by(Task.user_id, Task.status))
+    for user_id, status, count in rows:
+        deltas[task_key(user_id, status)] -= count
+    return deltas
+
+def apply_deltas(connection, deltas):
+    """Применяет изменения счетчиков {(kind, owner_id, status): delta} в текущей транзакции.
+
+    Используется и обработчиками событий, и массовыми операциями,
+    которые обходят ORM (bulk insert, UPDATE/DELETE по множеству строк).
+    """
+    table = StatCounter.__table__
+    make_insert = _UPSERT_INSERTS.get(connection.dialect.name)
+
+    for (kind, owner_id, status), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        if make_insert is not None:
+            stmt = make_insert(table).values(kind=kind, owner_id=owner_id, status=status, value=delta)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.kind, table.c.owner_id, table.c.status],
+                set_={'value': table.c.value + delta})
+            connection.execute(stmt)
+            continue
+
+        result = connection.execute(
+            table.update()
+            .where(table.c.kind == kind, table.c.owner_id == owner_id, table.c.status == status)
+            .values(value=table.c.value + delta))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(
+                kind=kind, owner_id=owner_id, status=status, value=delta))
+
+def rebuild_counters():
+    """Пересчитывает все счетчики с нуля по таблицам клиентов и задач."""
+    table = StatCounter.__table__
+    columns = [table.c.kind, table.c.owner_id, table.c.status, table.c.value]
+    db.session.execute(delete(StatCounter))
+    customer_status = func.coalesce(Customer.status, '')
+    db.session.execute(insert(StatCounter).from_select(columns, select(
+        literal(StatCounter.CUSTOMER_STATUS),
+        literal(0),
+        customer_status,
+        func.count(Customer.id),
+    ).group_by(customer_status)))
+    task_owner = func.coalesce(Task.user_id, 0)
+    task_status = func.coalesce(Task.status, '')
+    db.session.execute(insert(StatCounter).from_select(columns, select(
+        literal(StatCounter.TASK_STATUS),
+        task_owner,
+        task_status,
+        func.count(Task.id),
+    ).group_by(task_owner, task_status)))
+    db.session.commit()
+
+def get_counts(kind, owner_id=0):
+    """Возвращает {статус: количество} для одного владельца счетчиков."""
+    rows = db.session.query(StatCounter.status, StatCounter.value) \
+        .filter_by(kind=kind, owner_id=owner_id).all()
+    return {status: value for status, value in rows if value}
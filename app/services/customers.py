@@ -0,0 +1,55 @@
+from sqlalchemy import select, delete, false
+from app import db
+from app.models import Customer, Task, StatCounter
+from app.services import fragments
+from app.services.counters import apply_deltas, customer_deltas_for, task_deltas_for
+
+# Сколько клиентов удаляется одним DELETE ... WHERE id IN (...)
+DELETE_CHUNK_SIZE = 500
+
+def _lock_chunk(chunk):
+    """Блокирует клиентов пачки и их задачи до конца транзакции.
+
+    Счетчики считаются запросом до DELETE; без блокировки параллельная правка
+    между ними (новая задача, смена статуса) разошлась бы со счетчиками.
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # Блокировок строк в SQLite нет: пустой DELETE открывает пишущую транзакцию,
+        # и до фиксации другие соединения базу не изменят
+        db.session.execute(delete(Customer).where(false()),
+                           execution_options={'synchronize_session': False})
+        return
+    db.session.execute(select(Customer.id).where(Customer.id.in_(chunk)).with_for_update())
+    db.session.execute(select(Task.id).where(Task.customer_id.in_(chunk)).with_for_update())
+
+def delete_customers(ids):
+    """Удаляет клиентов вместе с контактами и задачами и возвращает число удаленных клиентов.
+
+    Контакты и задачи удаляет база по ON DELETE CASCADE, поэтому на пачку клиентов
+    приходится один DELETE независимо от числа задач. События ORM при этом
+    не срабатывают: счетчики корректируются заранее посчитанными GROUP BY,
+    а поисковый индекс обновляют триггеры базы.
+    """
+    ids = sorted(set(ids))
+    deleted = 0
+    user_ids = set()
+
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[start:start + DELETE_CHUNK_SIZE]
+        _lock_chunk(chunk)
+        deltas = customer_deltas_for(Customer.id.in_(chunk))
+        deltas.update(task_deltas_for(Task.customer_id.in_(chunk)))
+        user_ids.update(owner_id for kind, owner_id, _ in deltas if kind == StatCounter.TASK_STATUS)
+
+        result = db.session.execute(delete(Customer).where(Customer.id.in_(chunk)),
+                                    execution_options={'synchronize_session': False})
+        apply_deltas(db.session.connection(), deltas)
+        deleted += result.rowcount
+
+    db.session.commit()
+
+    # Массовый DELETE не вызывает событий, по которым сбрасывается кэш страниц
+    fragments.touch('customers', 'tasks',
+                    *(f'customer:{customer_id}' for customer_id in ids),
+                    *(f'user-tasks:{user_id}' for user_id in user_ids))
+    return deleted
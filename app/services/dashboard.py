@@ -0,0 +1,71 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, case, and_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Customer, Task, StatCounter
+from app.services.counters import get_counts
+from app.services.reminders import unread_count
+
+# Количество задач, которые показываются в виджете дашборда
+UPCOMING_TASKS_LIMIT = 5
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def get_customer_stats():
+    """Берет количество клиентов по статусам из материализованных счетчиков."""
+    by_status = get_counts(StatCounter.CUSTOMER_STATUS)
+
+    return {
+        'total_customers': sum(by_status.values()),
+        'active_customers': by_status.get('Активный', 0),
+        'potential_customers': by_status.get('Потенциальный', 0),
+        'inactive_customers': by_status.get('Неактивный', 0),
+    }
+
+def get_task_stats(user_id, now=None):
+    """Статусы задач берет из счетчиков, просроченные и на сегодня считает одним запросом."""
+    now = now or datetime.utcnow()
+    today = datetime.combine(now.date(), time.min)
+    tomorrow = today + timedelta(days=1)
+    by_status = get_counts(StatCounter.TASK_STATUS, user_id)
+
+    # Эти числа зависят от текущего времени, поэтому счетчиками их не поддержать
+    row = db.session.query(
+        _count_if(Task.due_date < now),
+        _count_if(and_(Task.due_date >= today, Task.due_date < tomorrow)),
+    ).filter(
+        Task.user_id == user_id,
+        Task.status != 'Завершена',
+        Task.due_date < tomorrow
+    ).one()
+
+    return {
+        'total_tasks': sum(by_status.values()),
+        'new_tasks': by_status.get('Новая', 0),
+        'in_progress_tasks': by_status.get('В работе', 0),
+        'completed_tasks': by_status.get('Завершена', 0),
+        'postponed_tasks': by_status.get('Отложена', 0),
+        'overdue_tasks': row[0],
+        'today_tasks': row[1],
+    }
+
+def get_upcoming_tasks(user_id, limit=UPCOMING_TASKS_LIMIT):
+    """Возвращает только первые limit задач пользователя по сроку."""
+    return Task.query.options(joinedload(Task.customer)) \
+        .filter_by(user_id=user_id) \
+        .order_by(Task.due_date).limit(limit).all()
+
+def get_recent_customers(limit=5):
+    return Customer.query.order_by(Customer.created_at.desc()).limit(limit).all()
+
+def get_dashboard_stats(user_id, now=None):
+    """Собирает все данные для дашборда."""
+    now = now or datetime.utcnow()
+    stats = get_customer_stats()
+    stats.update(get_task_stats(user_id, now))
+    stats['recent_customers'] = get_recent_customers()
+    stats['user_tasks'] = get_upcoming_tasks(user_id)
+    stats['unread_reminders'] = unread_count(user_id)
+    stats['now'] = now
+    return stats
@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from datetime import datetime, date
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from app import db
+from app.models import Customer, Contact, Task
+
+# Сколько строк читать из курсора за раз и сколько строк отдавать одним куском ответа
+YIELD_PER = 1000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Выгружаемые столбцы: читаем только их, без создания ORM-объектов
+EXPORT_COLUMNS = {
+    'customers': [Customer.id, Customer.name, Customer.company, Customer.email, Customer.phone,
+                  Customer.address, Customer.status, Customer.notes,
+                  Customer.created_at, Customer.updated_at],
+    'contacts': [Contact.id, Contact.customer_id, Contact.first_name, Contact.last_name,
+                 Contact.position, Contact.email, Contact.phone, Contact.is_primary,
+                 Contact.notes, Contact.created_at, Contact.updated_at],
+    'tasks': [Task.id, Task.title, Task.description, Task.due_date, Task.priority, Task.status,
+              Task.customer_id, Task.user_id, Task.created_at, Task.updated_at, Task.completed_at],
+}
+
+def build_query(entity, status=None, user_id=None, customer_id=None):
+    """Запрос выгрузки с теми же фильтрами, что и в списках: статус, пользователь, клиент."""
+    columns = EXPORT_COLUMNS[entity]
+    model = columns[0].class_
+    stmt = select(*columns)
+    if status and hasattr(model, 'status'):
+        stmt = stmt.where(model.status == status)
+    if user_id is not None and hasattr(model, 'user_id'):
+        stmt = stmt.where(model.user_id == user_id)
+    if customer_id is not None and hasattr(model, 'customer_id'):
+        stmt = stmt.where(model.customer_id == customer_id)
+    return stmt.order_by(model.id)
+
+def iter_rows(stmt):
+    """Читает результат порциями по YIELD_PER строк, не держа всю выборку в памяти."""
+    result = db.session.execute(stmt.execution_options(yield_per=YIELD_PER, stream_results=True))
+    for partition in result.partitions():
+        yield from partition
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _csv_chunks(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for number, row in enumerate(rows, start=1):
+        writer.writerow(['' if value is None else _plain(value) for value in row])
+        if number % YIELD_PER == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _jsonl_chunks(header, rows):
+    lines = []
+    for row in rows:
+        record = {key: _plain(value) for key, value in zip(header, row)}
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= YIELD_PER:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def generate(entity, fmt, **filters):
+    """Генератор кусков текста выгрузки в формате csv или jsonl."""
+    stmt = build_query(entity, **filters)
+    header = [column.key for column in EXPORT_COLUMNS[entity]]
+    rows = iter_rows(stmt)
+    if fmt == 'csv':
+        return _csv_chunks(header, rows)
+    return _jsonl_chunks(header, rows)
+
+def filename(entity, fmt):
+    return f"{entity}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+
+def export_response(entity, fmt, **filters):
+    """Потоковый HTTP-ответ с выгрузкой: строки уходят клиенту по мере чтения из базы."""
+    chunks = generate(entity, fmt, **filters)
+    return Response(stream_with_context(chunks),
+                    mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename(entity, fmt)}'})
@@ -0,0 +1,279 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+import uuid
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.models import User, Customer, Contact, Task
+from app.services.cache import TTLCache
+
+# Кэш отрендеренных фрагментов страниц (карточка клиента, дашборд).
+#
+# Ключ фрагмента включает версии сущностей, от которых он зависит. Версия —
+# случайная метка, которая хранится в том же хранилище и заменяется после
+# фиксации транзакции, изменившей клиента, контакт или задачу. Старые фрагменты
+# при этом не удаляются сразу, а перестают находиться; в памяти их вытесняет LRU,
+# а в каталоге — периодическая очистка, которая удаляет просроченные файлы и
+# держит их число в пределах FRAGMENT_CACHE_SIZE.
+#
+# FRAGMENT_CACHE выбирает хранилище:
+#   'filesystem' — файлы в FRAGMENT_CACHE_DIR, общие для всех процессов на сервере;
+#   'memory'     — LRU в памяти процесса (только для одного процесса: изменения,
+#                  сделанные в другом воркере, станут видны лишь через TTL);
+#   'null'       — кэш выключен.
+
+# Ключ в session.info с версиями, которые нужно сменить после фиксации
+_TOUCHED_KEY = 'touched_fragment_versions'
+
+# Версии хранятся без срока жизни, но LRU/очистка может их удалить — это просто промах
+_VERSION_TTL = 365 * 24 * 3600
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+class MemoryBackend:
+    """Хранилище в памяти процесса поверх TTLCache."""
+
+    def __init__(self, maxsize=512, ttl=300):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def delete(self, key):
+        self.cache.pop(key)
+
+    def clear(self):
+        self.cache.clear()
+
+class FileSystemBackend:
+    """Хранилище в файлах каталога: по файлу на ключ, запись через атомарную замену.
+
+    Время изменения файла выставляется равным сроку его жизни, поэтому очистка
+    (_sweep) обходится os.scandir без чтения файлов: удаляет просроченные, а если
+    файлов все равно больше maxsize — те, чей срок истекает раньше всех.
+    Очистка запускается каждые sweep_every записей этого процесса.
+    """
+
+    def __init__(self, directory, maxsize=512, sweep_every=None):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.sweep_every = sweep_every or max(1, maxsize // 10)
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires_at, value), f, pickle.HIGHEST_PROTOCOL)
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            # Кэш не должен ронять запрос: при ошибке записи просто не кэшируем
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            self._sweep()
+
+    def _sweep(self):
+        now = time.time()
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        expires_at = entry.stat().st_mtime
+                    except OSError:
+                        continue
+                    if entry.name.startswith('.tmp-'):
+                        # Недописанный файл упавшего процесса: у него mtime — время создания
+                        if expires_at < now - 3600:
+                            entries.append((0, entry.path))
+                        continue
+                    entries.append((expires_at, entry.path))
+        except OSError:
+            return
+        entries.sort()
+        excess = len(entries) - self.maxsize
+        for number, (expires_at, path) in enumerate(entries):
+            if expires_at >= now and number >= excess:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+def init_app(app):
+    app.config.setdefault('FRAGMENT_CACHE', os.environ.get('FRAGMENT_CACHE', 'filesystem'))
+    app.config.setdefault('FRAGMENT_CACHE_DIR', os.path.join(app.instance_path, 'fragment-cache'))
+    app.config.setdefault('FRAGMENT_CACHE_SIZE', 512)
+    app.config.setdefault('FRAGMENT_CACHE_TTL', 300)
+    # Дашборд зависит еще и от текущего времени (просроченные задачи, задачи на сегодня)
+    app.config.setdefault('DASHBOARD_CACHE_TTL', 60)
+    # Доля просроченных задач в отчетах тоже меняется со временем
+    app.config.setdefault('REPORT_CACHE_TTL', 600)
+
+    kind = app.config['FRAGMENT_CACHE']
+    if kind == 'filesystem':
+        backend = FileSystemBackend(app.config['FRAGMENT_CACHE_DIR'], app.config['FRAGMENT_CACHE_SIZE'])
+    elif kind == 'memory':
+        backend = MemoryBackend(app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL'])
+    elif kind in ('null', 'none', '', None):
+        backend = NullBackend()
+    else:
+        raise ValueError(f'Неизвестное хранилище FRAGMENT_CACHE: {kind}')
+    app.extensions['fragment_cache'] = backend
+
+def _backend():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('fragment_cache')
+
+def version(name):
+    """Текущая метка версии сущности, например 'customer:5' или 'user-tasks:2'."""
+    backend = _backend()
+    if backend is None:
+        return None
+    key = f'version:{name}'
+    value = backend.get(key)
+    if value is None:
+        value = uuid.uuid4().hex[:12]
+        backend.set(key, value, _VERSION_TTL)
+    return value
+
+def touch(*names):
+    """Сменяет версии сущностей: все фрагменты, зависящие от них, становятся устаревшими."""
+    backend = _backend()
+    if backend is None:
+        return
+    for name in names:
+        backend.delete(f'version:{name}')
+
+def cached(name, depends_on, render, ttl=None):
+    """Возвращает фрагмент из кэша или вызывает render() и сохраняет результат.
+
+    name — уникальная часть ключа (страница и параметры, включая пользователя,
+    если фрагмент от него зависит); depends_on — имена версий для version().
+    """
+    backend = _backend()
+    if backend is None:
+        return render()
+    versions = ':'.join(version(dependency) for dependency in depends_on)
+    key = f'fragment:{name}:{versions}'
+    value = backend.get(key)
+    if value is None:
+        value = render()
+        backend.set(key, value, ttl or current_app.config['FRAGMENT_CACHE_TTL'])
+    return value
+
+def customer_versions(customer_id):
+    # Карточка показывает имена исполнителей задач
+    return [f'customer:{customer_id}', 'usernames']
+
+def dashboard_versions(user_id):
+    return ['customers', f'user-tasks:{user_id}', f'reminders:{user_id}']
+
+def report_versions():
+    return ['customers', 'tasks']
+
+def _remember(target, *names):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_TOUCHED_KEY, set()).update(names)
+
+def _attribute_values(target, attribute):
+    """Текущее и прежнее значение внешнего ключа (задачу могли перевести на другого клиента)."""
+    history = inspect(target).attrs[attribute].history
+    values = {getattr(target, attribute)}
+    values.update(history.deleted or ())
+    return {value for value in values if value is not None}
+
+@event.listens_for(Customer, 'after_insert')
+@event.listens_for(Customer, 'after_update')
+@event.listens_for(Customer, 'after_delete')
+def _customer_changed(mapper, connection, target):
+    # Дашборд показывает последних клиентов и счетчики по всем клиентам
+    _remember(target, f'customer:{target.id}', 'customers')
+
+@event.listens_for(Contact, 'after_insert')
+@event.listens_for(Contact, 'after_update')
+@event.listens_for(Contact, 'after_delete')
+def _contact_changed(mapper, connection, target):
+    _remember(target, *(f'customer:{customer_id}'
+                        for customer_id in _attribute_values(target, 'customer_id')))
+
+@event.listens_for(Task, 'after_insert')
+@event.listens_for(Task, 'after_update')
+@event.listens_for(Task, 'after_delete')
+def _task_changed(mapper, connection, target):
+    names = [f'customer:{customer_id}' for customer_id in _attribute_values(target, 'customer_id')]
+    names += [f'user-tasks:{user_id}' for user_id in _attribute_values(target, 'user_id')]
+    # Отчеты строятся по всем задачам
+    _remember(target, 'tasks', *names)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    # Имя пользователя есть в его дашборде и в задачах на карточках клиентов. Переименования
+    # редки, поэтому сбрасываем одну общую версию, а не версии всех клиентов с его задачами.
+    deleted = inspect(target).deleted
+    if deleted or inspect(target).attrs.username.history.has_changes():
+        _remember(target, 'usernames', f'user-tasks:{target.id}')
+
+@event.listens_for(Session, 'after_commit')
+def _touch_after_commit(session):
+    names = session.info.pop(_TOUCHED_KEY, None)
+    if names:
+        touch(*names)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_touched(session):
+    session.info.pop(_TOUCHED_KEY, None)
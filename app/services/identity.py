@@ -0,0 +1,66 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import User, UserIdentity
+from app.services.cache import TTLCache
+
+# Ключ в session.info со списком пользователей, измененных в текущей транзакции
+_CHANGED_KEY = 'changed_user_ids'
+
+def init_app(app):
+    """Создает кэш пользователей приложения (USER_CACHE_TTL секунд, USER_CACHE_SIZE записей)."""
+    app.config.setdefault('USER_CACHE_TTL', 30)
+    app.config.setdefault('USER_CACHE_SIZE', 1024)
+    app.extensions['user_cache'] = TTLCache(maxsize=app.config['USER_CACHE_SIZE'],
+                                            ttl=app.config['USER_CACHE_TTL'])
+
+def _cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('user_cache')
+
+def load_identity(user_id):
+    """Возвращает UserIdentity из кэша, при промахе — одним запросом по первичному ключу."""
+    cache = _cache()
+    identity = cache.get(user_id) if cache is not None else None
+    if identity is not None:
+        return identity
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    identity = UserIdentity.from_user(user)
+    if cache is not None:
+        cache.set(user_id, identity)
+    return identity
+
+def invalidate(user_id):
+    cache = _cache()
+    if cache is not None:
+        cache.pop(user_id)
+
+def _remember_change(target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED_KEY, set()).add(target.id)
+    invalidate(target.id)
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    _remember_change(target)
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _remember_change(target)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    # Повторно сбрасываем после фиксации: между flush и commit другой запрос
+    # мог успеть положить в кэш старые данные
+    for user_id in session.info.pop(_CHANGED_KEY, ()):
+        invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop(_CHANGED_KEY, None)
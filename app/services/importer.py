@@ -0,0 +1,205 @@
+import csv
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert
+from werkzeug.datastructures import MultiDict
+from app import db
+from app.models import Customer, Contact, StatCounter
+from app.forms.customer import CustomerForm, ContactForm
+from app.services.counters import apply_deltas
+from app.services import fragments
+
+# Количество клиентов в одной пачке INSERT и одной транзакции
+DEFAULT_BATCH_SIZE = 1000
+
+# Сколько ошибок хранить в отчете; остальные только считаются
+MAX_REPORTED_ERRORS = 1000
+
+CUSTOMER_FIELDS = ('name', 'company', 'email', 'phone', 'address', 'status', 'notes')
+CONTACT_FIELDS = ('first_name', 'last_name', 'position', 'email', 'phone', 'is_primary', 'notes')
+
+# В CSV и плоском JSONL поля контакта идут с этим префиксом: contact_first_name и т.д.
+CONTACT_PREFIX = 'contact_'
+
+_TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on', 'да')
+
+class ImportFormatError(Exception):
+    pass
+
+class ImportReport:
+    """Итог импорта: сколько строк обработано и какие строки отклонены."""
+
+    def __init__(self):
+        self.rows = 0
+        self.customers = 0
+        self.contacts = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, messages):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, messages))
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    raise ImportFormatError(f'Неизвестный формат файла: {filename}. Поддерживаются CSV и JSONL.')
+
+def iter_rows(stream, fmt):
+    """Читает файл построчно и возвращает пары (номер строки, словарь)."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, row if isinstance(row, dict) else None
+    else:
+        raise ImportFormatError(f'Неизвестный формат: {fmt}')
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'y' if value else ''
+    return str(value).strip()
+
+def _split_row(row):
+    """Разбирает строку на поля клиента и список контактов."""
+    customer = {field: _text(row.get(field)) for field in CUSTOMER_FIELDS}
+    contacts = []
+    flat_contact = {field: _text(row.get(CONTACT_PREFIX + field)) for field in CONTACT_FIELDS}
+    if any(flat_contact.values()):
+        contacts.append(flat_contact)
+    for contact in row.get('contacts') or []:
+        if isinstance(contact, dict):
+            contacts.append({field: _text(contact.get(field)) for field in CONTACT_FIELDS})
+    return customer, contacts
+
+def _form_errors(form, prefix=''):
+    return [f'{prefix}{form[name].label.text}: {message}'
+            for name, messages in form.errors.items()
+            for message in messages]
+
+class _RowValidator:
+    """Проверяет строки теми же правилами, что и формы CustomerForm и ContactForm.
+
+    Формы создаются один раз и переиспользуются для каждой строки.
+    """
+
+    def __init__(self):
+        self.customer_form = CustomerForm(formdata=None, meta={'csrf': False})
+        self.contact_form = ContactForm(formdata=None, meta={'csrf': False})
+
+    def validate(self, customer, contacts):
+        errors = []
+        if not customer['status']:
+            customer['status'] = 'Новый'
+        self.customer_form.process(MultiDict(customer))
+        if self.customer_form.validate():
+            customer = {field: self.customer_form[field].data or None for field in CUSTOMER_FIELDS}
+        else:
+            errors.extend(_form_errors(self.customer_form))
+
+        clean_contacts = []
+        has_primary = False
+        for number, contact in enumerate(contacts, start=1):
+            contact['is_primary'] = 'y' if contact['is_primary'].lower() in _TRUE_VALUES else ''
+            self.contact_form.process(MultiDict(contact))
+            if not self.contact_form.validate():
+                errors.extend(_form_errors(self.contact_form, f'Контакт {number}: '))
+                continue
+            data = {field: self.contact_form[field].data for field in CONTACT_FIELDS}
+            for field in ('position', 'email', 'phone', 'notes'):
+                data[field] = data[field] or None
+            # У клиента может быть только один основной контакт
+            data['is_primary'] = bool(data['is_primary']) and not has_primary
+            has_primary = has_primary or data['is_primary']
+            clean_contacts.append(data)
+
+        return customer, clean_contacts, errors
+
+def _flush_batch(batch, report):
+    """Вставляет пачку клиентов и их контактов двумя INSERT и фиксирует транзакцию."""
+    if not batch:
+        return
+    now = datetime.utcnow()
+    customer_rows = [dict(customer, created_at=now, updated_at=now) for customer, _ in batch]
+    ids = db.session.scalars(
+        insert(Customer).returning(Customer.id, sort_by_parameter_order=True),
+        customer_rows).all()
+
+    contact_rows = [dict(contact, customer_id=customer_id, created_at=now, updated_at=now)
+                    for customer_id, (_, contacts) in zip(ids, batch)
+                    for contact in contacts]
+    if contact_rows:
+        db.session.execute(insert(Contact), contact_rows)
+
+    # Массовая вставка не вызывает событий ORM, поэтому счетчики обновляем сами
+    deltas = Counter((StatCounter.CUSTOMER_STATUS, 0, row['status']) for row in customer_rows)
+    apply_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    # и сбрасываем закэшированный дашборд (последние клиенты, счетчики)
+    fragments.touch('customers')
+
+    report.customers += len(customer_rows)
+    report.contacts += len(contact_rows)
+
+def import_customers(stream, fmt, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Импортирует клиентов и контакты из потока CSV или JSONL.
+
+    Файл читается построчно, строки проверяются правилами форм и
+    вставляются пачками по batch_size с фиксацией транзакции на каждую
+    пачку, поэтому расход памяти не зависит от размера файла.
+    progress(report), если задан, вызывается после фиксации каждой пачки.
+    """
+    report = ImportReport()
+    validator = _RowValidator()
+    batch = []
+
+    for line, row in iter_rows(stream, fmt):
+        report.rows += 1
+        if row is None:
+            report.add_error(line, ['Строка не является JSON-объектом'])
+            continue
+        customer, contacts = _split_row(row)
+        customer, contacts, errors = validator.validate(customer, contacts)
+        if errors:
+            report.add_error(line, errors)
+            continue
+        batch.append((customer, contacts))
+        if len(batch) >= batch_size:
+            _flush_batch(batch, report)
+            batch = []
+            if progress is not None:
+                progress(report)
+
+    _flush_batch(batch, report)
+    return report
+
+def import_file(path, fmt=None, batch_size=DEFAULT_BATCH_SIZE):
+    fmt = fmt or detect_format(path)
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        return import_customers(stream, fmt, batch_size)
+
+def write_error_report(report, path):
+    """Записывает отклоненные строки в CSV: номер строки и причины."""
+    with open(path, 'w', encoding='utf-8', newline='') as stream:
+        writer = csv.writer(stream)
+        writer.writerow(['line', 'errors'])
+        for line, messages in report.errors:
+            writer.writerow([line, '; '.join(messages)])
@@ -0,0 +1,290 @@
+import io
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, or_
+from app import db
+from app.models import Job
+
+# Очередь фоновых задач в таблице job.
+#
+# Веб-запрос только ставит задачу в очередь (enqueue) и сразу отвечает; выполняет
+# ее процесс flask worker, который забирает задачи по одной атомарным UPDATE
+# и запускает обработчик, зарегистрированный декоратором @handler. Обработчик
+# сообщает ход выполнения через JobContext.progress, а его результат (словарь)
+# сохраняется в job.result как JSON. Пока обработчик работает, отдельный поток
+# раз в JOB_HEARTBEAT_SECONDS отмечает, что исполнитель жив. Задача, чей
+# исполнитель перестал подавать признаки жизни дольше JOB_STALE_SECONDS,
+# возвращается в очередь, но не больше JOB_MAX_ATTEMPTS раз; результат прежнего
+# исполнителя после этого не записывается.
+
+HANDLERS = {}
+
+# Подписи видов задач для страниц
+KIND_LABELS = {}
+
+# Виды задач, которые нельзя запускать повторно: они фиксируют работу по частям,
+# и повтор с начала задвоил бы уже сделанное
+NOT_RETRYABLE = set()
+
+def handler(kind, label, retry=True):
+    def decorator(f):
+        HANDLERS[kind] = f
+        KIND_LABELS[kind] = label
+        if not retry:
+            NOT_RETRYABLE.add(kind)
+        return f
+    return decorator
+
+class JobContext:
+    """То, что обработчик знает о своей задаче: id и способ сообщить прогресс."""
+
+    def __init__(self, job_id, worker):
+        self.id = job_id
+        self.worker = worker
+
+    def progress(self, percent, message=None):
+        """Сохраняет прогресс задачи; фиксирует текущую транзакцию, поэтому вызывается между пачками."""
+        db.session.execute(update(Job).where(Job.id == self.id, Job.worker == self.worker).values(
+            progress=max(0, min(100, int(percent))), message=message, heartbeat_at=datetime.utcnow()))
+        db.session.commit()
+
+def init_app(app):
+    app.config.setdefault('JOB_FILES_DIR', os.path.join(app.instance_path, 'job-files'))
+    app.config.setdefault('JOB_STALE_SECONDS', 600)
+    # Как часто работающая задача отмечает, что исполнитель жив; должно быть заметно меньше JOB_STALE_SECONDS
+    app.config.setdefault('JOB_HEARTBEAT_SECONDS', 30)
+    app.config.setdefault('JOB_MAX_ATTEMPTS', 3)
+    app.config.setdefault('JOB_POLL_INTERVAL', 1.0)
+    # Выполнять задачи сразу в запросе, без flask worker (разработка и тесты)
+    app.config.setdefault('JOBS_EAGER', os.environ.get('JOBS_EAGER', '').lower() in ('1', 'true', 'yes', 'on'))
+
+def files_dir():
+    directory = current_app.config['JOB_FILES_DIR']
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def enqueue(kind, payload=None, user=None):
+    """Ставит задачу в очередь и возвращает ее; в режиме JOBS_EAGER сразу выполняет."""
+    if kind not in HANDLERS:
+        raise ValueError(f'Неизвестный вид фоновой задачи: {kind}')
+    job = Job(kind=kind, payload=json.dumps(payload or {}, ensure_ascii=False),
+              user_id=user.id if user is not None else None)
+    db.session.add(job)
+    db.session.commit()
+    if current_app.config['JOBS_EAGER']:
+        if claim('eager', job.id) is not None:
+            run(job.id, 'eager')
+        db.session.refresh(job)
+    return job
+
+def claim(worker, job_id=None):
+    """Забирает из очереди самую раннюю задачу (или задачу job_id) и возвращает ее id.
+
+    Выбор и смена статуса — один UPDATE с условием status = 'queued', поэтому
+    два исполнителя не получат одну и ту же задачу ни в SQLite, ни в PostgreSQL.
+    """
+    if job_id is None:
+        job_id = select(Job.id).where(Job.status == Job.QUEUED).order_by(Job.id).limit(1).scalar_subquery()
+    now = datetime.utcnow()
+    claimed = db.session.scalar(
+        update(Job)
+        .where(Job.id == job_id, Job.status == Job.QUEUED)
+        .values(status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+                attempts=Job.attempts + 1)
+        .returning(Job.id))
+    db.session.commit()
+    return claimed
+
+def _finish(job_id, worker, **values):
+    """Записывает итог задачи, если она все еще числится за этим исполнителем."""
+    finished = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.worker == worker, Job.status == Job.RUNNING)
+        .values(finished_at=datetime.utcnow(), **values)).rowcount
+    db.session.commit()
+    if not finished:
+        current_app.logger.warning('Фоновая задача %s уже не числится за исполнителем %s, итог не записан',
+                                   job_id, worker)
+    return bool(finished)
+
+def _heartbeat(app, job_id, worker, stop):
+    # Отдельное соединение: сессия обработчика может быть посреди долгой транзакции
+    with app.app_context():
+        while not stop.wait(app.config['JOB_HEARTBEAT_SECONDS']):
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(update(Job).where(Job.id == job_id, Job.worker == worker)
+                                       .values(heartbeat_at=datetime.utcnow()))
+            except Exception as e:
+                # Например, база занята записью обработчика; попробуем в следующий раз
+                app.logger.warning('Не удалось отметить исполнителя задачи %s: %s', job_id, e)
+
+def run(job_id, worker):
+    """Выполняет уже забранную исполнителем worker задачу и сохраняет результат или ошибку."""
+    job = db.session.get(Job, job_id)
+    kind = job.kind
+    payload = json.loads(job.payload or '{}')
+    db.session.commit()
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(current_app._get_current_object(), job_id, worker, stop),
+                            daemon=True)
+    beat.start()
+    try:
+        result = HANDLERS[kind](JobContext(job_id, worker), **payload)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Фоновая задача %s (%s) завершилась ошибкой', job_id, kind)
+        _finish(job_id, worker, status=Job.FAILED, message='Ошибка',
+                error=''.join(traceback.format_exception_only(type(e), e)).strip())
+        return False
+    finally:
+        stop.set()
+        beat.join()
+    return _finish(job_id, worker, status=Job.DONE, progress=100, message='Готово',
+                   result=json.dumps(result or {}, ensure_ascii=False, default=str))
+
+def _discard_upload(payload):
+    # path в payload — загруженный файл, который принадлежит задаче (импорт)
+    path = json.loads(payload or '{}').get('path')
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def requeue_stale():
+    """Возвращает в очередь задачи, исполнитель которых пропал.
+
+    Задачи, исчерпавшие попытки, и задачи из NOT_RETRYABLE помечаются ошибкой,
+    а их загруженные файлы удаляются.
+    """
+    config = current_app.config
+    stale = datetime.utcnow() - timedelta(seconds=config['JOB_STALE_SECONDS'])
+    criteria = [Job.status == Job.RUNNING, Job.heartbeat_at < stale]
+    failed = db.session.scalars(
+        update(Job).where(*criteria, or_(Job.attempts >= config['JOB_MAX_ATTEMPTS'],
+                                         Job.kind.in_(NOT_RETRYABLE)))
+        .values(status=Job.FAILED, worker=None, error='Исполнитель не отвечает', finished_at=datetime.utcnow())
+        .returning(Job.payload)).all()
+    requeued = db.session.execute(
+        update(Job).where(*criteria).values(status=Job.QUEUED, worker=None)).rowcount
+    db.session.commit()
+    for payload in failed:
+        _discard_upload(payload)
+    return requeued, len(failed)
+
+def work(app, name, stop, once=False):
+    """Цикл исполнителя: забирает задачи, пока не выставлен stop (или очередь не опустела при once)."""
+    with app.app_context():
+        poll = app.config['JOB_POLL_INTERVAL']
+        last_check = None
+        while not stop.is_set():
+            now = datetime.utcnow()
+            if last_check is None or now - last_check > timedelta(minutes=1):
+                requeue_stale()
+                last_check = now
+            job_id = claim(name)
+            if job_id is not None:
+                run(job_id, name)
+                continue
+            db.session.remove()
+            if once:
+                return
+            stop.wait(poll)
+
+def _work_threads(app, prefix, threads, once, stop):
+    workers = [threading.Thread(target=work, args=(app, f'{prefix}:{number}', stop, once), daemon=True)
+               for number in range(threads)]
+    for thread in workers:
+        thread.start()
+    try:
+        # join с таймаутом, чтобы Ctrl+C доходил до основного потока
+        while any(thread.is_alive() for thread in workers):
+            for thread in workers:
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in workers:
+            thread.join()
+
+def _process_main(app, prefix, threads, once):
+    # Соединения пула родителя дочернему процессу использовать нельзя
+    with app.app_context():
+        db.engine.dispose(close=False)
+    _work_threads(app, prefix, threads, once, threading.Event())
+
+def run_worker(app, processes=1, threads=1, once=False):
+    """Запускает processes процессов по threads потоков-исполнителей в каждом.
+
+    Потоки подходят для задач, ждущих базу и диск; чтобы нагрузить несколько
+    ядер задачами, занятыми Python-кодом (импорт, выгрузка), нужны процессы.
+    """
+    prefix = f'{socket.gethostname()}:{os.getpid()}'
+    if processes <= 1:
+        _work_threads(app, prefix, threads, once, threading.Event())
+        return
+    # fork: дочерние процессы получают уже созданное приложение с той же конфигурацией
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=_process_main, args=(app, f'{prefix}-{number}', threads, once))
+                for number in range(processes)]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+            child.join()
+
+def result_of(job):
+    return json.loads(job.result) if job.result else {}
+
+# Обработчики. Сервисы импортируются внутри функций, чтобы не было циклических импортов.
+
+# Каждая пачка импорта фиксируется отдельно, повтор задвоил бы уже вставленных клиентов
+@handler('import-customers', 'Импорт клиентов', retry=False)
+def _import_customers(job, path, fmt, batch_size=None):
+    from app.services import importer
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, 'rb') as raw:
+            stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            report = importer.import_customers(
+                stream, fmt, batch_size or importer.DEFAULT_BATCH_SIZE,
+                progress=lambda report: job.progress(100 * raw.tell() // size,
+                                                     f'Обработано строк: {report.rows}'))
+    finally:
+        # Повтора не будет (retry=False), поэтому загруженный файл больше не нужен
+        os.remove(path)
+    return {'rows': report.rows, 'customers': report.customers, 'contacts': report.contacts,
+            'error_count': report.error_count, 'errors': report.errors[:100]}
+
+@handler('export', 'Выгрузка')
+def _export(job, entity, fmt, filters):
+    from app.services import exporter
+    name = f'{job.id}-{exporter.filename(entity, fmt)}'
+    path = os.path.join(files_dir(), name)
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        for chunk in exporter.generate(entity, fmt, **filters):
+            output.write(chunk)
+    return {'file': name, 'size': os.path.getsize(path)}
+
+@handler('delete-customers', 'Удаление клиентов')
+def _delete_customers(job, ids):
+    from app.services.customers import delete_customers
+    job.progress(0, f'Удаляется клиентов: {len(ids)}')
+    return {'deleted': delete_customers(ids)}
+
+@handler('rollup', 'Пересчет дневных итогов')
+def _rollup(job, first=None, last=None):
+    from app.services import rollup
+    parse = lambda value: datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    return rollup.rollup(parse(first), parse(last)).as_dict()
+
+@handler('reminders', 'Напоминания о сроках')
+def _reminders(job):
+    from app.services import reminders
+    return reminders.run().as_dict()
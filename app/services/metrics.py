@@ -0,0 +1,154 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from flask import current_app, g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from app import db
+
+# Сбор метрик запросов: число SQL-запросов и их суммарное время, время рендеринга
+# шаблонов и полное время ответа по каждому endpoint. Включается METRICS_ENABLED=1,
+# отдает заголовок Server-Timing, пишет медленные запросы в лог вместе с их SQL
+# и накапливает данные для страницы /admin/metrics.
+
+# Сколько SQL-запросов медленного ответа попадает в лог
+_LOGGED_STATEMENTS = 30
+
+class EndpointStats:
+    """Последние METRICS_WINDOW замеров одного endpoint."""
+
+    def __init__(self, window):
+        self.requests = 0
+        self.samples = deque(maxlen=window)
+
+    def add(self, sample):
+        self.requests += 1
+        self.samples.append(sample)
+
+class MetricsRegistry:
+    def __init__(self, window=1000):
+        self.window = window
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, total_ms, sql_count, sql_ms, render_ms):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats(self.window)
+            stats.add((total_ms, sql_count, sql_ms, render_ms))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self):
+        """Сводка по endpoint, отсортированная по p99 времени ответа."""
+        with self._lock:
+            items = [(endpoint, stats.requests, list(stats.samples))
+                     for endpoint, stats in self._stats.items()]
+
+        rows = []
+        for endpoint, requests, samples in items:
+            totals = sorted(sample[0] for sample in samples)
+            queries = [sample[1] for sample in samples]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': requests,
+                'p50_ms': percentile(totals, 50),
+                'p90_ms': percentile(totals, 90),
+                'p99_ms': percentile(totals, 99),
+                'max_ms': round(totals[-1], 1),
+                'avg_queries': round(sum(queries) / len(queries), 1),
+                'max_queries': max(queries),
+                'avg_sql_ms': round(sum(sample[2] for sample in samples) / len(samples), 1),
+                'avg_render_ms': round(sum(sample[3] for sample in samples) / len(samples), 1),
+            })
+        rows.sort(key=lambda row: row['p99_ms'], reverse=True)
+        return rows
+
+def percentile(sorted_values, p):
+    """Процентиль методом ближайшего ранга по отсортированному списку."""
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values), max(1, math.ceil(p / 100 * len(sorted_values)))) - 1
+    return round(sorted_values[index], 1)
+
+def init_app(app):
+    app.config.setdefault('METRICS_ENABLED', os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes', 'on'))
+    app.config.setdefault('METRICS_SLOW_REQUEST_MS', int(os.environ.get('METRICS_SLOW_REQUEST_MS', 500)))
+    app.config.setdefault('METRICS_WINDOW', 1000)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    app.extensions['metrics'] = MetricsRegistry(app.config['METRICS_WINDOW'])
+    with app.app_context():
+        engine = db.engine
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+def get_registry():
+    return current_app.extensions.get('metrics')
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время начала хранится в контексте выполнения запроса, а не в соединении:
+    # если запрос упадет, after_cursor_execute не вызовется, и копить нечего
+    if context is not None and has_request_context() and 'metrics_started' in g:
+        context.metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'metrics_started', None)
+    if started is None or not has_request_context() or 'metrics_started' not in g:
+        return
+    elapsed = (time.perf_counter() - started) * 1000
+    g.metrics_sql_ms += elapsed
+    g.metrics_statements.append((elapsed, statement))
+
+def _before_render(sender, template, context, **extra):
+    if 'metrics_started' in g:
+        g.metrics_render_stack.append(time.perf_counter())
+
+def _after_render(sender, template, context, **extra):
+    if 'metrics_started' in g and g.metrics_render_stack:
+        started = g.metrics_render_stack.pop()
+        # Вложенный рендеринг (фрагмент внутри страницы) уже входит во внешний
+        if not g.metrics_render_stack:
+            g.metrics_render_ms += (time.perf_counter() - started) * 1000
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql_ms = 0.0
+    g.metrics_statements = []
+    g.metrics_render_ms = 0.0
+    g.metrics_render_stack = []
+
+def _finish_request(response):
+    if 'metrics_started' not in g:
+        return response
+    total_ms = (time.perf_counter() - g.metrics_started) * 1000
+    sql_count = len(g.metrics_statements)
+    endpoint = request.endpoint or 'unknown'
+
+    # Время SQL частично приходится на рендеринг (ленивые отношения в шаблоне)
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;dur={g.metrics_sql_ms:.1f};desc="{sql_count} queries"',
+        f'render;dur={g.metrics_render_ms:.1f}',
+        f'total;dur={total_ms:.1f}',
+    ])
+    get_registry().record(endpoint, total_ms, sql_count, g.metrics_sql_ms, g.metrics_render_ms)
+
+    if total_ms >= current_app.config['METRICS_SLOW_REQUEST_MS']:
+        statements = sorted(g.metrics_statements, key=lambda item: item[0], reverse=True)
+        lines = [f'{elapsed:8.1f} ms  {" ".join(statement.split())}'
+                 for elapsed, statement in statements[:_LOGGED_STATEMENTS]]
+        current_app.logger.warning(
+            'Медленный запрос %s %s (%s): %.0f ms, SQL %d шт. / %.0f ms, шаблоны %.0f ms\n%s',
+            request.method, request.full_path, endpoint, total_ms, sql_count,
+            g.metrics_sql_ms, g.metrics_render_ms, '\n'.join(lines))
+    return response
@@ -0,0 +1,152 @@
+from datetime import datetime
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import func, text, tuple_, and_, or_, false, literal
+from app import db
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+def _dump_value(value):
+    # JSON не умеет даты, поэтому храним их строкой ISO с пометкой
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+def _load_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачную подписанную строку."""
+    return _serializer().dumps([_dump_value(value) for value in values])
+
+def decode_cursor(cursor, size):
+    """Распаковывает курсор; для поврежденного или чужого курсора возвращает None."""
+    if not cursor:
+        return None
+    try:
+        values = _serializer().loads(cursor)
+        if not isinstance(values, list) or len(values) != size:
+            return None
+        return [_load_value(value) for value in values]
+    except (BadSignature, ValueError, KeyError, TypeError):
+        return None
+
+class KeysetPage:
+    """Страница результатов keyset-пагинации с курсорами на соседние страницы."""
+
+    def __init__(self, items, columns, has_next, has_prev, per_page):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next and bool(items)
+        self.has_prev = has_prev and bool(items)
+        self.next_cursor = encode_cursor(self._key(items[-1], columns)) if self.has_next else None
+        self.prev_cursor = encode_cursor(self._key(items[0], columns)) if self.has_prev else None
+        # Заполняется отдельно: точный COUNT(*), оценка или None
+        self.total = None
+        self.total_is_estimate = False
+
+    @staticmethod
+    def _key(item, columns):
+        return [getattr(item, column.key) for column in columns]
+
+def _nulls_first(descending):
+    # SQLite (и MySQL) считают NULL меньше любого значения, PostgreSQL — больше
+    nulls_low = db.session.get_bind().dialect.name != 'postgresql'
+    return nulls_low != descending
+
+def _comes_after(columns, values, descending):
+    """Условие «строка идет после курсора values» в порядке сортировки по columns.
+
+    Раскрывает сравнение по столбцам (a > x OR a = x AND (b > y ...)) с учетом того,
+    где база располагает NULL, поэтому подходит и для необязательных столбцов
+    (например, срока задачи), где сравнение кортежей теряет строки с NULL.
+    """
+    column, value = columns[0], values[0]
+    nulls_first = _nulls_first(descending)
+    if value is None:
+        after = column.isnot(None) if nulls_first else false()
+        equal = column.is_(None)
+    else:
+        # Параметром с типом столбца: с голыми True/False SQLAlchemy не строит < и >
+        value = literal(value, column.type)
+        after = column < value if descending else column > value
+        if not nulls_first:
+            after = or_(after, column.is_(None))
+        equal = column == value
+    if len(columns) == 1:
+        return after
+    return or_(after, and_(equal, _comes_after(columns[1:], values[1:], descending)))
+
+def keyset_paginate(query, columns, per_page, after=None, before=None, descending=False, nullable=False):
+    """Возвращает страницу query, упорядоченного по columns (по возрастанию или убыванию).
+
+    Вместо OFFSET используется условие (col1, col2, ...) > курсор, поэтому
+    любая страница читается по индексу за одно и то же время.
+    Последний столбец должен быть уникальным (обычно первичный ключ).
+    nullable=True нужен, если в первых столбцах бывает NULL.
+    """
+    before_values = decode_cursor(before, len(columns))
+    after_values = decode_cursor(after, len(columns))
+
+    def condition(values, reverse):
+        # reverse: условие «до курсора» = «после курсора» в обратном порядке
+        if nullable:
+            return _comes_after(columns, values, descending != reverse)
+        key = tuple_(*columns)
+        return key < tuple_(*values) if descending != reverse else key > tuple_(*values)
+
+    def order(reverse):
+        return [column.desc() if descending != reverse else column for column in columns]
+
+    if before_values is not None:
+        # Идем назад: читаем в обратном порядке и разворачиваем
+        rows = query.filter(condition(before_values, True)) \
+            .order_by(*order(True)) \
+            .limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], columns, True, has_prev, per_page)
+
+    if after_values is not None:
+        query = query.filter(condition(after_values, False))
+    rows = query.order_by(*order(False)).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    return KeysetPage(rows[:per_page], columns, has_next, after_values is not None, per_page)
+
+def estimate_count(model):
+    """Приблизительное число строк таблицы без полного COUNT(*).
+
+    Берется из статистики планировщика (pg_class для PostgreSQL,
+    sqlite_stat1 после ANALYZE для SQLite), иначе из максимального id.
+    """
+    table = model.__table__.name
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        value = db.session.execute(
+            text('SELECT reltuples FROM pg_class WHERE oid = CAST(:table AS regclass)'),
+            {'table': table}).scalar()
+        if value and value > 0:
+            return int(value)
+    elif dialect == 'sqlite':
+        has_stats = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")).scalar()
+        if has_stats:
+            stat = db.session.execute(
+                text('SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1'),
+                {'table': table}).scalar()
+            if stat:
+                return int(stat.split()[0])
+
+    return db.session.query(func.max(model.id)).scalar() or 0
+
+def fill_total(page, query, model, mode):
+    """Заполняет page.total в зависимости от режима: 'exact', 'estimate' или 'none'."""
+    if mode == 'exact':
+        page.total = query.order_by(None).count()
+    elif mode == 'estimate':
+        page.total = estimate_count(model)
+        page.total_is_estimate = True
+    return page
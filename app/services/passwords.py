@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+# Алгоритм и стоимость по умолчанию (как в Werkzeug 2.3)
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+# Варианты, которые сравнивает flask bench-passwords, если не указаны свои
+BENCHMARK_METHODS = (
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:100000',
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+)
+
+def method_prefix(method):
+    """Параметры хэша, которые Werkzeug запишет перед солью, например 'pbkdf2:sha256:600000'.
+
+    Повторяет нормализацию werkzeug.security._hash_internal, чтобы не считать ради нее хэш.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    return method
+
+class HasherBusy(Exception):
+    """Все потоки проверки паролей заняты дольше PASSWORD_HASH_TIMEOUT."""
+
+class PasswordHasher:
+    """Хэширование паролей с настраиваемым алгоритмом и ограниченным пулом потоков.
+
+    hashlib отпускает GIL во время вычисления хэша, поэтому пул из
+    PASSWORD_HASH_WORKERS потоков ограничивает число ядер, занятых проверкой
+    паролей: волна входов в начале смены не отнимает процессор у остальных запросов.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=None, timeout=10):
+        self.method = method
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                           thread_name_prefix='password-hash')
+        # Параметры хэша в нормализованном виде, например 'pbkdf2:sha256:600000'
+        self.prefix = method_prefix(method)
+        # Хэш для проверки несуществующих пользователей, чтобы время ответа не выдавало их
+        self._dummy_hash = None
+
+    def _run(self, func, *args):
+        future = self.executor.submit(func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HasherBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def verify_dummy(self, password):
+        if self._dummy_hash is None:
+            # Считается в пуле, как и любой хэш; гонка двух запросов безвредна
+            self._dummy_hash = self.hash('')
+        self.verify(self._dummy_hash, password)
+        return False
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix
+
+def init_app(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+    app.config.setdefault('PASSWORD_HASH_WORKERS', int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None)
+    app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+    app.extensions['password_hasher'] = PasswordHasher(app.config['PASSWORD_HASH_METHOD'],
+                                                       app.config['PASSWORD_HASH_WORKERS'],
+                                                       app.config['PASSWORD_HASH_TIMEOUT'])
+
+_default_hasher = None
+
+def get_hasher():
+    global _default_hasher
+    if has_app_context() and 'password_hasher' in current_app.extensions:
+        return current_app.extensions['password_hasher']
+    # Вне приложения (скрипты, консоль) используем настройки по умолчанию
+    if _default_hasher is None:
+        _default_hasher = PasswordHasher()
+    return _default_hasher
+
+def benchmark(methods=BENCHMARK_METHODS, duration=2.0):
+    """Меряет, сколько проверок пароля в секунду выполняет одно ядро для каждого метода."""
+    results = []
+    for method in methods:
+        password_hash = generate_password_hash('benchmark-password', method)
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration or count == 0:
+            check_password_hash(password_hash, 'benchmark-password')
+            count += 1
+        elapsed = time.perf_counter() - started
+        results.append({
+            'method': method,
+            'logins_per_sec_per_core': round(count / elapsed, 2),
+            'ms_per_login': round(elapsed / count * 1000, 2),
+            'hash_length': len(password_hash),
+        })
+    return results
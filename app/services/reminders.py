@@ -0,0 +1,282 @@
+import json
+import os
+import smtplib
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from flask import current_app
+from sqlalchemy import select, update, insert, func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User, Customer, Task, ReminderDigest, Watermark
+from app.services import fragments
+from app.services.tasks import COMPLETED
+
+# Напоминания о сроках задач.
+#
+# Планировщик (flask reminders или фоновая задача 'reminders') при каждом запуске
+# обрабатывает окно времени от прошлого запуска до текущего момента, отметка
+# которого хранится в таблице watermark. В окне ищутся задачи, срок которых
+# наступил (просрочены) или наступит в ближайшие REMINDER_LEAD_HOURS часов,
+# — это два диапазонных запроса по индексу срока задачи, поэтому стоимость
+# запуска зависит от числа задач в окне, а не от размера таблицы. Окна не
+# пересекаются, так что о каждом событии напоминание приходит один раз.
+# Найденные задачи собираются в одну сводку на пользователя (reminder_digest),
+# которую видно в интерфейсе и которая отправляется через хранилище доставки
+# (REMINDER_BACKEND: file, smtp или null).
+
+WATERMARK = 'reminders'
+
+# Сколько раз пытаться доставить сводку
+MAX_DELIVERY_ATTEMPTS = 3
+
+# Сколько сводок загружать для доставки за раз
+DELIVERY_BATCH_SIZE = 200
+
+class NullBackend:
+    def send(self, user, digest, items):
+        pass
+
+class FileBackend:
+    """Складывает письма в файлы .eml каталога REMINDER_OUTBOX_DIR (разработка и тесты)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, user, digest, items):
+        message = build_message(user, digest, items)
+        path = os.path.join(self.directory, f'digest-{digest.id}.eml')
+        with open(path + '.tmp', 'wb') as stream:
+            stream.write(message.as_bytes())
+        os.replace(path + '.tmp', path)
+
+class SmtpBackend:
+    def __init__(self, host, port, username=None, password=None, use_tls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def send(self, user, digest, items):
+        message = build_message(user, digest, items)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+def init_app(app):
+    app.config.setdefault('REMINDER_BACKEND', os.environ.get('REMINDER_BACKEND', 'file'))
+    app.config.setdefault('REMINDER_OUTBOX_DIR', os.path.join(app.instance_path, 'reminders'))
+    app.config.setdefault('REMINDER_LEAD_HOURS', 24)
+    app.config.setdefault('REMINDER_ITEMS_LIMIT', 50)
+    app.config.setdefault('MAIL_SERVER', os.environ.get('MAIL_SERVER', 'localhost'))
+    app.config.setdefault('MAIL_PORT', int(os.environ.get('MAIL_PORT', 25)))
+    app.config.setdefault('MAIL_USERNAME', os.environ.get('MAIL_USERNAME'))
+    app.config.setdefault('MAIL_PASSWORD', os.environ.get('MAIL_PASSWORD'))
+    app.config.setdefault('MAIL_USE_TLS', os.environ.get('MAIL_USE_TLS', '').lower() in ('1', 'true', 'yes', 'on'))
+    app.config.setdefault('MAIL_SENDER', os.environ.get('MAIL_SENDER', 'crm@localhost'))
+
+    kind = app.config['REMINDER_BACKEND']
+    if kind == 'file':
+        backend = FileBackend(app.config['REMINDER_OUTBOX_DIR'])
+    elif kind == 'smtp':
+        backend = SmtpBackend(app.config['MAIL_SERVER'], app.config['MAIL_PORT'],
+                              app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'],
+                              app.config['MAIL_USE_TLS'])
+    elif kind in ('null', 'none', '', None):
+        backend = NullBackend()
+    elif hasattr(kind, 'send'):
+        # Можно передать свой объект с методом send(user, digest, items)
+        backend = kind
+    else:
+        raise ValueError(f'Неизвестное хранилище REMINDER_BACKEND: {kind}')
+    app.extensions['reminder_backend'] = backend
+
+def build_message(user, digest, items):
+    message = EmailMessage()
+    message['From'] = current_app.config['MAIL_SENDER']
+    message['To'] = user.email
+    message['Subject'] = f'CRM: просроченных задач {digest.overdue}, со сроком в ближайшее время {digest.due_soon}'
+    lines = [f'Здравствуйте, {user.get_full_name()}!', '']
+    for title, kind in (('Просроченные задачи:', 'overdue'), ('Срок наступает в ближайшее время:', 'due_soon')):
+        selected = [item for item in items if item['kind'] == kind]
+        if selected:
+            lines.append(title)
+            lines += [f"  - {item['title']} ({item['customer']}), срок {item['due_date'][:16].replace('T', ' ')}"
+                      for item in selected]
+            lines.append('')
+    shown = len(items)
+    if shown < digest.overdue + digest.due_soon:
+        lines.append(f'Показаны {shown} из {digest.overdue + digest.due_soon} задач.')
+    message.set_content('\n'.join(lines))
+    return message
+
+def items_of(digest):
+    return json.loads(digest.items) if digest.items else []
+
+class ReminderReport:
+    def __init__(self):
+        self.window_start = None
+        self.window_end = None
+        self.digests = 0
+        self.due_soon = 0
+        self.overdue = 0
+        self.delivered = 0
+        self.failed = 0
+
+    def as_dict(self):
+        return {
+            'window_start': self.window_start.isoformat() if self.window_start else None,
+            'window_end': self.window_end.isoformat() if self.window_end else None,
+            'digests': self.digests,
+            'due_soon': self.due_soon,
+            'overdue': self.overdue,
+            'delivered': self.delivered,
+            'failed': self.failed,
+        }
+
+def _claim_window(now, lead):
+    """Сдвигает отметку на now и возвращает начало окна; None, если окно уже забрал другой запуск.
+
+    Отметка меняется условным UPDATE в той же транзакции, что и вставка сводок:
+    параллельный запуск дождется ее фиксации и не найдет прежнего значения.
+    """
+    previous = db.session.scalar(select(Watermark.value).where(Watermark.name == WATERMARK))
+    if previous is None:
+        # Первый запуск: задачи, просроченные за последние lead часов, и ближайшие
+        try:
+            with db.session.begin_nested():
+                db.session.add(Watermark(name=WATERMARK, value=now))
+        except IntegrityError:
+            # Параллельный первый запуск успел создать отметку: дальше как при обычном запуске
+            previous = db.session.scalar(select(Watermark.value).where(Watermark.name == WATERMARK))
+        else:
+            return now - lead
+    if previous >= now:
+        return None
+    claimed = db.session.execute(
+        update(Watermark).where(Watermark.name == WATERMARK, Watermark.value == previous)
+        .values(value=now, updated_at=datetime.utcnow())).rowcount
+    return previous if claimed else None
+
+def _window_rows(start, end):
+    """Незавершенные задачи с исполнителем и сроком в (start, end]; читаются только нужные столбцы."""
+    return db.session.execute(
+        select(Task.id, Task.user_id, Task.title, Task.due_date, Customer.name)
+        .join_from(Task, Customer)
+        .where(Task.due_date > start, Task.due_date <= end,
+               Task.status != COMPLETED, Task.user_id.isnot(None))
+        .execution_options(yield_per=1000))
+
+def collect(start, end, lead, limit):
+    """Собирает события окна по пользователям: {user_id: {'due_soon', 'overdue', 'items'}}."""
+    found = defaultdict(lambda: {'due_soon': 0, 'overdue': 0, 'items': []})
+    for kind, rows in (('overdue', _window_rows(start, end)),
+                       ('due_soon', _window_rows(start + lead, end + lead))):
+        for task_id, user_id, title, due_date, customer in rows:
+            entry = found[user_id]
+            entry[kind] += 1
+            if len(entry['items']) < limit:
+                entry['items'].append({'task_id': task_id, 'title': title, 'customer': customer,
+                                       'due_date': due_date.isoformat(), 'kind': kind})
+    return found
+
+def run(now=None):
+    """Один запуск планировщика: сводки за окно с прошлого запуска и их доставка."""
+    config = current_app.config
+    now = now or datetime.utcnow()
+    lead = timedelta(hours=config['REMINDER_LEAD_HOURS'])
+    report = ReminderReport()
+
+    start = _claim_window(now, lead)
+    if start is None:
+        db.session.rollback()
+        return report
+    report.window_start, report.window_end = start, now
+
+    found = collect(start, now, lead, config['REMINDER_ITEMS_LIMIT'])
+    rows = [{'user_id': user_id, 'window_start': start, 'window_end': now,
+             'due_soon': entry['due_soon'], 'overdue': entry['overdue'],
+             'items': json.dumps(entry['items'], ensure_ascii=False), 'created_at': now}
+            for user_id, entry in found.items()]
+    if rows:
+        db.session.execute(insert(ReminderDigest), rows)
+    db.session.commit()
+
+    report.digests = len(rows)
+    report.due_soon = sum(entry['due_soon'] for entry in found.values())
+    report.overdue = sum(entry['overdue'] for entry in found.values())
+    fragments.touch(*(f'reminders:{user_id}' for user_id in found))
+    deliver_pending(report)
+    return report
+
+def _pending_batch(after_id):
+    digests = ReminderDigest.query.filter(
+        ReminderDigest.id > after_id,
+        ReminderDigest.delivered_at.is_(None),
+        ReminderDigest.delivery_attempts < MAX_DELIVERY_ATTEMPTS) \
+        .order_by(ReminderDigest.id).limit(DELIVERY_BATCH_SIZE).all()
+    users = User.query.filter(User.id.in_({digest.user_id for digest in digests})).all()
+    # Отсоединяем от сессии, чтобы фиксация после каждой сводки не перечитывала их из базы
+    for instance in digests + users:
+        db.session.expunge(instance)
+    return digests, {user.id: user for user in users}
+
+def deliver_pending(report=None):
+    """Отправляет недоставленные сводки пачками по DELIVERY_BATCH_SIZE, в том числе не ушедшие в прошлые запуски.
+
+    Итог отправки фиксируется после каждой сводки, чтобы при сбое уже
+    отправленные не ушли повторно.
+    """
+    report = report or ReminderReport()
+    backend = current_app.extensions['reminder_backend']
+    last_id = 0
+    while True:
+        digests, users = _pending_batch(last_id)
+        if not digests:
+            return report
+        last_id = digests[-1].id
+        for digest in digests:
+            values = {'delivery_attempts': ReminderDigest.delivery_attempts + 1}
+            try:
+                backend.send(users[digest.user_id], digest, items_of(digest))
+            except Exception as e:
+                current_app.logger.warning('Не удалось отправить сводку напоминаний %s: %s', digest.id, e)
+                values['delivery_error'] = str(e)[:200]
+                report.failed += 1
+            else:
+                values.update(delivered_at=datetime.utcnow(), delivery_error=None)
+                report.delivered += 1
+            db.session.execute(update(ReminderDigest).where(ReminderDigest.id == digest.id).values(**values))
+            db.session.commit()
+
+def unread_count(user_id):
+    return db.session.scalar(select(func.count()).where(
+        ReminderDigest.user_id == user_id, ReminderDigest.read_at.is_(None)))
+
+def mark_read(user_id):
+    updated = db.session.execute(
+        update(ReminderDigest)
+        .where(ReminderDigest.user_id == user_id, ReminderDigest.read_at.is_(None))
+        .values(read_at=datetime.utcnow())).rowcount
+    db.session.commit()
+    if updated:
+        fragments.touch(f'reminders:{user_id}')
+    return updated
+
+def run_forever(app, interval, stop=None):
+    """Запускает планировщик каждые interval секунд до остановки (Ctrl+C или stop)."""
+    stop = stop or threading.Event()
+    with app.app_context():
+        while not stop.is_set():
+            report = run()
+            if report.window_start is not None:
+                app.logger.info('Напоминания: %s', report.as_dict())
+            db.session.remove()
+            stop.wait(interval)
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func, case, and_, or_
+from app import db
+from app.models import User, Customer, Task, TaskDailyStat, CustomerDailyStat
+from app.services import fragments, rollup
+from app.services.tasks import COMPLETED, TASK_PRIORITIES
+
+# Отчеты по задачам и клиентам за период [start, end); границы — начала суток.
+#
+# Все группировки выполняет база: в Python приходят уже агрегированные строки
+# (единицы-сотни на отчет), которые только раскладываются в таблицы.
+# Отчеты по неделям и месяцам берут дни до отметки flask rollup из дневных итогов
+# и только остаток периода считают по исходным таблицам.
+# Готовый отчет кэшируется по периоду до изменения задач или клиентов.
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+def _week(column):
+    """Понедельник недели, на которую приходится column, строкой YYYY-MM-DD."""
+    if _dialect() == 'sqlite':
+        return func.date(column, '-6 days', 'weekday 1')
+    return func.to_char(func.date_trunc('week', column), 'YYYY-MM-DD')
+
+def _month(column):
+    if _dialect() == 'sqlite':
+        return func.strftime('%Y-%m', column)
+    return func.to_char(column, 'YYYY-MM')
+
+def _days_between(start, end):
+    if _dialect() == 'sqlite':
+        return func.julianday(end) - func.julianday(start)
+    return func.extract('epoch', end - start) / 86400
+
+def _split(start, end):
+    """Делит период на часть, покрытую дневными итогами, и остаток; пустая часть — None."""
+    done = rollup.watermark()
+    if done is None:
+        return None, (start, end)
+    boundary = datetime(done.year, done.month, done.day) + timedelta(days=1)
+    rolled = (start, min(end, boundary)) if start < boundary else None
+    raw = (max(start, boundary), end) if end > boundary else None
+    return rolled, raw
+
+def _user_names(user_ids):
+    users = db.session.execute(
+        select(User.id, User.username, User.first_name, User.last_name)
+        .where(User.id.in_(user_ids))).all()
+    names = {row.id: ' '.join(filter(None, (row.first_name, row.last_name))) or row.username
+             for row in users}
+    return lambda user_id: names.get(user_id, 'Не назначен')
+
+def task_throughput(start, end):
+    """Завершенные задачи по сотрудникам и неделям."""
+    rolled, raw = _split(start, end)
+    rows = []
+    if rolled:
+        week = _week(TaskDailyStat.day)
+        rows += db.session.execute(
+            select(TaskDailyStat.user_id, week, func.sum(TaskDailyStat.completed))
+            .where(TaskDailyStat.day >= rolled[0].date(), TaskDailyStat.day < rolled[1].date(),
+                   TaskDailyStat.completed > 0)
+            .group_by(TaskDailyStat.user_id, week)).all()
+    if raw:
+        week = _week(Task.completed_at)
+        rows += db.session.execute(
+            select(func.coalesce(Task.user_id, 0), week, func.count())
+            .where(Task.status == COMPLETED, Task.completed_at >= raw[0], Task.completed_at < raw[1])
+            .group_by(Task.user_id, week)).all()
+
+    weeks = sorted({row[1] for row in rows})
+    counts = defaultdict(lambda: defaultdict(int))
+    for user_id, week_start, count in rows:
+        counts[user_id][week_start] += count
+    name = _user_names([user_id for user_id in counts if user_id])
+    table = [{'user': name(user_id),
+              'counts': [by_week.get(week_start, 0) for week_start in weeks],
+              'total': sum(by_week.values())}
+             for user_id, by_week in counts.items()]
+    table.sort(key=lambda row: row['total'], reverse=True)
+    return {'weeks': weeks, 'rows': table}
+
+def completion_time(start, end):
+    """Среднее время от создания до завершения задачи в днях, по сотрудникам и в целом."""
+    days = _days_between(Task.created_at, Task.completed_at)
+    rows = db.session.execute(
+        select(Task.user_id, func.count(), func.avg(days))
+        .where(Task.status == COMPLETED, Task.completed_at >= start, Task.completed_at < end,
+               Task.created_at.isnot(None))
+        .group_by(Task.user_id)).all()
+
+    name = _user_names([user_id for user_id, _, _ in rows if user_id is not None])
+    table = [{'user': name(user_id), 'tasks': count, 'avg_days': round(float(average or 0), 1)}
+             for user_id, count, average in rows]
+    table.sort(key=lambda row: row['avg_days'])
+    total = sum(count for _, count, _ in rows)
+    # Среднее по всем задачам — взвешенное по числу задач каждого сотрудника
+    overall = sum(count * float(average or 0) for _, count, average in rows) / total if total else 0
+    return {'rows': table, 'tasks': total, 'avg_days': round(overall, 1)}
+
+def overdue_rate(start, end, now):
+    """Доля просроченных задач по приоритетам среди задач со сроком в периоде, уже наступившим.
+
+    Просроченной считается задача, завершенная позже срока или не завершенная к сроку.
+    """
+    overdue = or_(Task.completed_at > Task.due_date,
+                  and_(Task.status != COMPLETED, Task.due_date < now))
+    rows = db.session.execute(
+        select(Task.priority, func.count(), func.sum(case((overdue, 1), else_=0)))
+        .where(Task.due_date >= start, Task.due_date < min(end, now))
+        .group_by(Task.priority)).all()
+
+    by_priority = {priority: (count, int(late or 0)) for priority, count, late in rows}
+    order = TASK_PRIORITIES + sorted(set(by_priority) - set(TASK_PRIORITIES), key=str)
+    table = []
+    for priority in order:
+        count, late = by_priority.get(priority, (0, 0))
+        table.append({'priority': priority or 'Не указан', 'tasks': count, 'overdue': late,
+                      'rate': round(100 * late / count, 1) if count else 0})
+    return {'rows': table}
+
+def new_customers(start, end):
+    """Новые клиенты по месяцам и статусам."""
+    rolled, raw = _split(start, end)
+    rows = []
+    if rolled:
+        month = _month(CustomerDailyStat.day)
+        rows += db.session.execute(
+            select(month, CustomerDailyStat.status, func.sum(CustomerDailyStat.created))
+            .where(CustomerDailyStat.day >= rolled[0].date(), CustomerDailyStat.day < rolled[1].date())
+            .group_by(month, CustomerDailyStat.status)).all()
+    if raw:
+        month = _month(Customer.created_at)
+        rows += db.session.execute(
+            select(month, Customer.status, func.count())
+            .where(Customer.created_at >= raw[0], Customer.created_at < raw[1])
+            .group_by(month, Customer.status)).all()
+
+    statuses = sorted({status or 'Не указан' for _, status, _ in rows})
+    counts = defaultdict(lambda: defaultdict(int))
+    for month_start, status, count in rows:
+        counts[month_start][status or 'Не указан'] += count
+    table = [{'month': month_start,
+              'counts': [by_status.get(status, 0) for status in statuses],
+              'total': sum(by_status.values())}
+             for month_start, by_status in sorted(counts.items())]
+    return {'statuses': statuses, 'rows': table}
+
+def build_report(start, end):
+    """Все отчеты за период; результат кэшируется по границам периода."""
+    def render():
+        now = datetime.utcnow()
+        return {
+            'throughput': task_throughput(start, end),
+            'completion_time': completion_time(start, end),
+            'overdue_rate': overdue_rate(start, end, now),
+            'new_customers': new_customers(start, end),
+            'generated_at': now,
+        }
+
+    return fragments.cached(f'report:{start:%Y-%m-%d}:{end:%Y-%m-%d}', fragments.report_versions(),
+                            render, current_app.config['REPORT_CACHE_TTL'])
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, func, case, literal, union_all, or_
+from app import db
+from app.models import Customer, Task, TaskDailyStat, CustomerDailyStat, Watermark
+from app.services.tasks import COMPLETED
+
+# Дневные итоги (rollup) по задачам и клиентам.
+#
+# flask rollup пересчитывает только дни после отметки 'rollup' в таблице watermark
+# и до вчерашнего дня включительно (текущий день еще меняется). Каждый день
+# считается одним INSERT ... SELECT с группировкой в базе: старые строки дня
+# удаляются и вставляются заново, поэтому повторный пересчет любого периода
+# (flask rollup --from ... --to ...) безопасен. Отчеты читают итоги за дни до
+# отметки и досчитывают по исходным таблицам только хвост после нее.
+
+WATERMARK = 'rollup'
+
+# Сколько дней пересчитывается в одной транзакции
+CHUNK_DAYS = 31
+
+class RollupReport:
+    def __init__(self):
+        self.days = 0
+        self.task_rows = 0
+        self.customer_rows = 0
+
+    def as_dict(self):
+        return {'days': self.days, 'task_rows': self.task_rows, 'customer_rows': self.customer_rows}
+
+def _start_of(day):
+    return datetime(day.year, day.month, day.day)
+
+def watermark():
+    """Последний полностью посчитанный день или None, если итоги еще не считались."""
+    value = db.session.scalar(select(Watermark.value).where(Watermark.name == WATERMARK))
+    return value.date() if value is not None else None
+
+def _set_watermark(day):
+    row = db.session.get(Watermark, WATERMARK)
+    if row is None:
+        db.session.add(Watermark(name=WATERMARK, value=_start_of(day)))
+    elif row.value.date() < day:
+        row.value = _start_of(day)
+
+def _first_day():
+    # Без отметки начинаем с самой ранней записи
+    first = [value for value in (db.session.scalar(select(func.min(Task.created_at))),
+                                 db.session.scalar(select(func.min(Customer.created_at))))
+             if value is not None]
+    return min(first).date() if first else None
+
+def _task_rows(start, end):
+    """SELECT дневных итогов задач за [start, end) для INSERT ... SELECT."""
+    user_id = func.coalesce(Task.user_id, 0)
+    overdue = or_(Task.completed_at > Task.due_date, Task.status != COMPLETED)
+
+    def part(column, created=0, completed=0, due=0, overdue=literal(0), where=()):
+        return select(func.date(column).label('day'), user_id.label('user_id'), Task.status.label('status'),
+                      literal(created).label('created'), literal(completed).label('completed'),
+                      literal(due).label('due'), overdue.label('overdue')) \
+            .where(column >= start, column < end, *where)
+
+    rows = union_all(
+        part(Task.created_at, created=1),
+        part(Task.completed_at, completed=1, where=[Task.status == COMPLETED]),
+        part(Task.due_date, due=1, overdue=case((overdue, 1), else_=0)),
+    ).subquery()
+    return select(rows.c.day, rows.c.user_id, rows.c.status,
+                  func.sum(rows.c.created), func.sum(rows.c.completed),
+                  func.sum(rows.c.due), func.sum(rows.c.overdue)) \
+        .group_by(rows.c.day, rows.c.user_id, rows.c.status)
+
+def _customer_rows(start, end):
+    day = func.date(Customer.created_at)
+    return select(day, func.coalesce(Customer.status, ''), func.count()) \
+        .where(Customer.created_at >= start, Customer.created_at < end) \
+        .group_by(day, func.coalesce(Customer.status, ''))
+
+def _rollup_range(first, last, report):
+    start, end = _start_of(first), _start_of(last + timedelta(days=1))
+    db.session.execute(delete(TaskDailyStat).where(TaskDailyStat.day >= first, TaskDailyStat.day <= last))
+    db.session.execute(delete(CustomerDailyStat).where(CustomerDailyStat.day >= first, CustomerDailyStat.day <= last))
+    report.task_rows += db.session.execute(insert(TaskDailyStat).from_select(
+        ['day', 'user_id', 'status', 'created', 'completed', 'due', 'overdue'],
+        _task_rows(start, end))).rowcount
+    report.customer_rows += db.session.execute(insert(CustomerDailyStat).from_select(
+        ['day', 'status', 'created'], _customer_rows(start, end))).rowcount
+    report.days += (last - first).days + 1
+
+def rollup(first=None, last=None):
+    """Пересчитывает дневные итоги за дни first..last включительно.
+
+    Без аргументов обрабатывает дни после отметки до вчерашнего дня. Отметка
+    сдвигается вперед после каждой пачки дней, поэтому прерванный пересчет
+    продолжится с того же места; пересчет периода в прошлом ее не трогает.
+    """
+    report = RollupReport()
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    if first is None:
+        done = watermark()
+        first = done + timedelta(days=1) if done is not None else _first_day()
+    last = min(last or yesterday, yesterday)
+    if first is None or first > last:
+        return report
+
+    # Отметку можно сдвигать, только если между ней и пересчитанными днями нет пропуска
+    done = watermark()
+    if done is not None:
+        contiguous = first <= done + timedelta(days=1)
+    else:
+        contiguous = first <= (_first_day() or first)
+    day = first
+    while day <= last:
+        chunk_last = min(day + timedelta(days=CHUNK_DAYS - 1), last)
+        _rollup_range(day, chunk_last, report)
+        if contiguous:
+            _set_watermark(chunk_last)
+        db.session.commit()
+        day = chunk_last + timedelta(days=1)
+    return report
@@ -0,0 +1,170 @@
+import re
+from sqlalchemy import event, text, or_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Customer, Contact
+
+# Полнотекстовые индексы SQLite FTS5 поверх таблиц customer и contact.
+# Таблицы external content: текст хранится только в исходных таблицах,
+# а триггеры держат индекс в актуальном состоянии при любых изменениях,
+# в том числе при массовых вставках и каскадных удалениях на стороне базы.
+_FTS_TABLES = {
+    'customer_fts': ('customer', ['name', 'company', 'email', 'phone', 'notes']),
+    'contact_fts': ('contact', ['first_name', 'last_name', 'email', 'phone']),
+}
+
+# Количество результатов каждого типа на странице поиска
+SEARCH_LIMIT = 50
+
+# Поля клиента, по которым работают подсказки при выборе клиента
+LOOKUP_COLUMNS = ('name', 'company')
+
+def _ddl(fts_table, source, columns):
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    delete_old = (f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) "
+                  f"VALUES ('delete', old.id, {old_values});")
+    insert_new = f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({cols}, "
+        f"content='{source}', content_rowid='id', tokenize='unicode61 remove_diacritics 2', "
+        # Отдельные индексы для коротких префиксов ускоряют подсказки при вводе
+        f"prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {source} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+def is_supported(connection):
+    return connection.dialect.name == 'sqlite'
+
+def create_search_index(connection):
+    """Создает FTS5-таблицы и триггеры синхронизации, если их еще нет."""
+    if not is_supported(connection):
+        return
+    for fts_table, (source, columns) in _FTS_TABLES.items():
+        for statement in _ddl(fts_table, source, columns):
+            connection.execute(text(statement))
+
+def drop_search_index(connection):
+    if not is_supported(connection):
+        return
+    for fts_table, (source, columns) in _FTS_TABLES.items():
+        for suffix in ('ai', 'ad', 'au'):
+            connection.execute(text(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}'))
+        connection.execute(text(f'DROP TABLE IF EXISTS {fts_table}'))
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_after_tables(target, connection, **kw):
+    create_search_index(connection)
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_before_tables(target, connection, **kw):
+    drop_search_index(connection)
+
+def rebuild_search_index(connection):
+    """Пересоздает FTS-таблицы и триггеры и индексирует текущие данные в открытой транзакции."""
+    if not is_supported(connection):
+        return False
+    drop_search_index(connection)
+    create_search_index(connection)
+    for fts_table in _FTS_TABLES:
+        connection.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+    return True
+
+def reindex():
+    """Полностью перестраивает поисковый индекс по текущим данным."""
+    rebuilt = rebuild_search_index(db.session.connection())
+    db.session.commit()
+    return rebuilt
+
+def build_match_query(query, columns=None):
+    """Превращает ввод пользователя в запрос FTS5: все слова, каждое как префикс."""
+    tokens = re.findall(r'\w+', query or '')
+    match = ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+    if match and columns:
+        match = '{%s} : (%s)' % (' '.join(columns), match)
+    return match
+
+def search_customers(query, limit=SEARCH_LIMIT):
+    """Клиенты, подходящие под запрос, в порядке релевантности (bm25)."""
+    match = build_match_query(query)
+    if not match:
+        return []
+    if not is_supported(db.session.connection()):
+        return _like_customers(query, limit)
+    ids = db.session.execute(text(
+        'SELECT rowid FROM customer_fts WHERE customer_fts MATCH :match '
+        'ORDER BY rank LIMIT :limit'), {'match': match, 'limit': limit}).scalars().all()
+    return _in_order(Customer, ids)
+
+def search_contacts(query, limit=SEARCH_LIMIT):
+    """Контакты, подходящие под запрос, в порядке релевантности (bm25)."""
+    match = build_match_query(query)
+    if not match:
+        return []
+    if not is_supported(db.session.connection()):
+        return _like_contacts(query, limit)
+    ids = db.session.execute(text(
+        'SELECT rowid FROM contact_fts WHERE contact_fts MATCH :match '
+        'ORDER BY rank LIMIT :limit'), {'match': match, 'limit': limit}).scalars().all()
+    return _in_order(Contact, ids, Contact.customer)
+
+def _in_order(model, ids, *eager):
+    # Загружаем найденные записи одним запросом и сохраняем порядок ранжирования
+    if not ids:
+        return []
+    query = model.query.filter(model.id.in_(ids))
+    if eager:
+        query = query.options(*[joinedload(relation) for relation in eager])
+    by_id = {item.id: item for item in query}
+    return [by_id[i] for i in ids if i in by_id]
+
+def _like_customers(query, limit):
+    # Запасной вариант для баз без FTS5: поиск по началу значения
+    pattern = f'{query.strip()}%'
+    return Customer.query.filter(or_(
+        Customer.name.ilike(pattern),
+        Customer.company.ilike(pattern),
+        Customer.email.ilike(pattern),
+        Customer.phone.ilike(pattern),
+    )).order_by(Customer.name).limit(limit).all()
+
+def _like_contacts(query, limit):
+    pattern = f'{query.strip()}%'
+    return Contact.query.options(joinedload(Contact.customer)).filter(or_(
+        Contact.first_name.ilike(pattern),
+        Contact.last_name.ilike(pattern),
+        Contact.email.ilike(pattern),
+        Contact.phone.ilike(pattern),
+    )).order_by(Contact.last_name).limit(limit).all()
+
+def lookup_customers(query, page=1, per_page=20):
+    """Подсказки для выбора клиента: (id, name, company) по префиксам слов.
+
+    Возвращает (строки, есть_ли_еще). Читает только нужные столбцы
+    и не загружает ORM-объекты.
+    """
+    offset = (max(page, 1) - 1) * per_page
+    match = build_match_query(query, LOOKUP_COLUMNS)
+
+    if not match:
+        rows = db.session.query(Customer.id, Customer.name, Customer.company) \
+            .order_by(Customer.name, Customer.id) \
+            .offset(offset).limit(per_page + 1).all()
+    elif is_supported(db.session.connection()):
+        rows = db.session.execute(text(
+            'SELECT customer.id, customer.name, customer.company FROM customer_fts '
+            'JOIN customer ON customer.id = customer_fts.rowid '
+            'WHERE customer_fts MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset'),
+            {'match': match, 'limit': per_page + 1, 'offset': offset}).all()
+    else:
+        pattern = f'{query.strip()}%'
+        rows = db.session.query(Customer.id, Customer.name, Customer.company) \
+            .filter(or_(Customer.name.ilike(pattern), Customer.company.ilike(pattern))) \
+            .order_by(Customer.name, Customer.id) \
+            .offset(offset).limit(per_page + 1).all()
+
+    return rows[:per_page], len(rows) > per_page
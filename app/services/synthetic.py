@@ -0,0 +1,157 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, func
+from app import db
+from app.models import User, Customer, Contact, Task, Role
+from app.forms.customer import CustomerForm
+from app.forms.task import TaskForm
+from app.services.counters import rebuild_counters
+from app.services.passwords import get_hasher
+from app.services import fragments
+
+# Пароль всех сгенерированных пользователей (для входа при нагрузочном тестировании)
+SYNTHETIC_PASSWORD = 'synthetic'
+
+# Статусы и приоритеты берем из форм, чтобы данные совпадали с вводимыми вручную
+CUSTOMER_STATUSES = [value for value, _ in CustomerForm.status.kwargs['choices']]
+TASK_STATUSES = [value for value, _ in TaskForm.status.kwargs['choices']]
+TASK_PRIORITIES = [value for value, _ in TaskForm.priority.kwargs['choices']]
+
+FIRST_NAMES = ['Иван', 'Петр', 'Алексей', 'Сергей', 'Дмитрий', 'Анна', 'Мария', 'Елена', 'Ольга', 'Наталья']
+LAST_NAMES = ['Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов', 'Новиков', 'Морозов']
+POSITIONS = ['Директор', 'Менеджер по закупкам', 'Бухгалтер', 'Инженер', 'Юрист', None]
+COMPANY_FORMS = ['ООО', 'АО', 'ИП', 'ПАО']
+COMPANY_WORDS = ['Ромашка', 'Вектор', 'Спектр', 'Альфа', 'Гранит', 'Север', 'Восход', 'Меридиан', 'Орбита', 'Фрегат']
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург', 'Самара']
+TASK_TITLES = ['Позвонить клиенту', 'Отправить коммерческое предложение', 'Подготовить договор',
+               'Согласовать счет', 'Провести встречу', 'Уточнить реквизиты', 'Выставить акт']
+
+class SyntheticReport:
+    def __init__(self):
+        self.users = 0
+        self.customers = 0
+        self.contacts = 0
+        self.tasks = 0
+
+    def as_dict(self):
+        return {'users': self.users, 'customers': self.customers,
+                'contacts': self.contacts, 'tasks': self.tasks}
+
+def _create_users(count, rng, now):
+    """Создает пользователей-сотрудников с общим паролем SYNTHETIC_PASSWORD."""
+    # Хэшируем пароль один раз: стоимость хэша рассчитана на вход, а не на массовую вставку
+    password_hash = get_hasher().hash(SYNTHETIC_PASSWORD)
+    start = (db.session.scalar(select(func.max(User.id))) or 0) + 1
+    rows = []
+    for number in range(start, start + count):
+        rows.append({
+            'username': f'synthetic{number}',
+            'email': f'synthetic{number}@example.com',
+            'password_hash': password_hash,
+            'role': Role.EMPLOYEE,
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'position': 'Менеджер по продажам',
+            'created_at': now,
+        })
+    if not rows:
+        return []
+    return db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), rows).all()
+
+def _customer_row(rng, now):
+    company = f'{rng.choice(COMPANY_FORMS)} «{rng.choice(COMPANY_WORDS)}-{rng.randint(1, 999)}»'
+    created_at = now - timedelta(days=rng.randint(0, 730), minutes=rng.randint(0, 1440))
+    return {
+        'name': f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}',
+        'company': company,
+        'email': f'info{rng.randint(1, 10 ** 6)}@example.com',
+        'phone': f'+7 9{rng.randint(10, 99)} {rng.randint(100, 999)}-{rng.randint(10, 99)}-{rng.randint(10, 99)}',
+        'address': f'г. {rng.choice(CITIES)}, ул. Ленина, д. {rng.randint(1, 200)}',
+        'status': rng.choice(CUSTOMER_STATUSES),
+        'notes': None,
+        'created_at': created_at,
+        'updated_at': created_at,
+    }
+
+def _contact_rows(customer_id, count, rng, now):
+    rows = []
+    for number in range(count):
+        rows.append({
+            'customer_id': customer_id,
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'position': rng.choice(POSITIONS),
+            'email': f'contact{rng.randint(1, 10 ** 6)}@example.com',
+            'phone': f'+7 9{rng.randint(10, 99)} {rng.randint(100, 999)}-{rng.randint(10, 99)}-{rng.randint(10, 99)}',
+            'is_primary': number == 0,
+            'created_at': now,
+            'updated_at': now,
+        })
+    return rows
+
+def _task_rows(customer_id, count, user_ids, rng, now):
+    rows = []
+    for _ in range(count):
+        status = rng.choice(TASK_STATUSES)
+        created_at = now - timedelta(days=rng.randint(0, 90))
+        rows.append({
+            'customer_id': customer_id,
+            'user_id': rng.choice(user_ids) if user_ids else None,
+            'title': rng.choice(TASK_TITLES),
+            'description': None,
+            'priority': rng.choice(TASK_PRIORITIES),
+            'status': status,
+            # Часть задач просрочена, часть приходится на сегодня и ближайшие недели
+            'due_date': now + timedelta(days=rng.randint(-30, 60), hours=rng.randint(-12, 12)),
+            'created_at': created_at,
+            'updated_at': created_at,
+            # Задача завершена не позже текущего момента, даже если создана недавно
+            'completed_at': min(created_at + timedelta(days=rng.randint(0, 10)), now) if status == 'Завершена' else None,
+        })
+    return rows
+
+def seed(customers, contacts_per=2, tasks_per=3, users=5, batch_size=1000, random_seed=None):
+    """Массово генерирует пользователей, клиентов, контакты и задачи.
+
+    Строки вставляются пачками по batch_size через INSERT ... RETURNING с фиксацией
+    транзакции на каждую пачку; счетчики пересчитываются один раз в конце.
+    Задачи распределяются между новыми пользователями, а если users=0 — между всеми.
+    """
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+    report = SyntheticReport()
+
+    user_ids = list(_create_users(users, rng, now))
+    db.session.commit()
+    report.users = len(user_ids)
+    if not user_ids:
+        user_ids = db.session.scalars(select(User.id)).all()
+
+    done = 0
+    while done < customers:
+        size = min(batch_size, customers - done)
+        customer_rows = [_customer_row(rng, now) for _ in range(size)]
+        ids = db.session.scalars(
+            insert(Customer).returning(Customer.id, sort_by_parameter_order=True),
+            customer_rows).all()
+
+        contact_rows = []
+        task_rows = []
+        for customer_id in ids:
+            contact_rows.extend(_contact_rows(customer_id, contacts_per, rng, now))
+            task_rows.extend(_task_rows(customer_id, tasks_per, user_ids, rng, now))
+        if contact_rows:
+            db.session.execute(insert(Contact), contact_rows)
+        if task_rows:
+            db.session.execute(insert(Task), task_rows)
+        db.session.commit()
+
+        done += size
+        report.customers += size
+        report.contacts += len(contact_rows)
+        report.tasks += len(task_rows)
+
+    # Массовая вставка обходит события ORM: пересчитываем счетчики и сбрасываем кэш страниц
+    rebuild_counters()
+    fragments.touch('customers', 'tasks', *(f'user-tasks:{user_id}' for user_id in user_ids))
+    return report
@@ -0,0 +1,209 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, case, and_
+from app import db
+from app.models import User, Task
+from app.forms.task import TaskForm
+from app.services import fragments
+from app.services.counters import apply_deltas, task_key
+
+TASK_STATUSES = [value for value, _ in TaskForm.status.kwargs['choices']]
+TASK_PRIORITIES = [value for value, _ in TaskForm.priority.kwargs['choices']]
+
+COMPLETED = 'Завершена'
+
+# Действия массовой обработки задач и нужен ли им параметр value
+BULK_ACTIONS = {
+    'complete': False,
+    'status': True,
+    'priority': True,
+    'reassign': True,
+    'shift_due': True,
+    'delete': False,
+}
+
+# Сколько задач можно обработать одним запросом
+BULK_LIMIT = 1000
+
+# Варианты сортировки списка задач: подпись, столбцы ключа, по убыванию ли и бывает ли NULL.
+# Каждому варианту соответствует индекс, начинающийся с user_id.
+TASK_SORTS = {
+    'due': ('Срок: сначала ближайшие', (Task.due_date, Task.id), False, True),
+    '-due': ('Срок: сначала дальние', (Task.due_date, Task.id), True, True),
+    '-created': ('Сначала новые', (Task.created_at, Task.id), True, False),
+}
+
+class BulkTaskError(Exception):
+    """Массовую операцию нельзя выполнить; текст — сообщение для пользователя."""
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+def parse_task_filters(args):
+    """Разбирает параметры запроса списка задач; неизвестные значения игнорируются."""
+    status = args.get('status', '')
+    priority = args.get('priority', '')
+    sort = args.get('sort', '')
+    return {
+        'status': status if status in TASK_STATUSES else '',
+        'priority': priority if priority in TASK_PRIORITIES else '',
+        'customer': args.get('customer', type=int),
+        'due_from': _parse_date(args.get('due_from', '')),
+        'due_to': _parse_date(args.get('due_to', '')),
+        'overdue': args.get('overdue') == '1',
+        'sort': sort if sort in TASK_SORTS else 'due',
+    }
+
+def _overdue(now):
+    return and_(Task.due_date < now, Task.status != COMPLETED)
+
+def _base_criteria(user_id, filters):
+    # Условия, не зависящие от фасетов статуса, приоритета и просрочки
+    criteria = [Task.user_id == user_id]
+    if filters['customer']:
+        criteria.append(Task.customer_id == filters['customer'])
+    if filters['due_from']:
+        criteria.append(Task.due_date >= filters['due_from'])
+    if filters['due_to']:
+        # Дата «по» включительно
+        criteria.append(Task.due_date < filters['due_to'] + timedelta(days=1))
+    return criteria
+
+def filter_tasks(query, user_id, filters, now):
+    """Накладывает на query задач условия из parse_task_filters."""
+    query = query.filter(*_base_criteria(user_id, filters))
+    if filters['status']:
+        query = query.filter(Task.status == filters['status'])
+    if filters['priority']:
+        query = query.filter(Task.priority == filters['priority'])
+    if filters['overdue']:
+        query = query.filter(_overdue(now))
+    return query
+
+def task_facets(user_id, filters, now):
+    """Количество задач по значениям фасетов одним сгруппированным запросом.
+
+    Запрос группирует задачи по (статус, приоритет) с учетом остальных фильтров;
+    для каждого фасета из этой сетки суммируются клетки, подходящие под выбор
+    в других фасетах, — как принято в фасетном поиске, собственный выбор фасета
+    на его счетчики не влияет.
+    """
+    rows = db.session.execute(
+        select(Task.status, Task.priority, func.count(),
+               func.sum(case((_overdue(now), 1), else_=0)))
+        .where(*_base_criteria(user_id, filters))
+        .group_by(Task.status, Task.priority)).all()
+
+    facets = {'status': Counter(), 'priority': Counter(), 'overdue': 0, 'total': 0}
+    for status, priority, count, overdue in rows:
+        matched = overdue if filters['overdue'] else count
+        if not filters['priority'] or priority == filters['priority']:
+            facets['status'][status] += matched
+        if not filters['status'] or status == filters['status']:
+            facets['priority'][priority] += matched
+            if not filters['priority'] or priority == filters['priority']:
+                facets['overdue'] += overdue
+                facets['total'] += matched
+    return facets
+
+def _shift_due(days):
+    # В SQLite нет арифметики над датами, сдвиг делаем функцией datetime()
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.datetime(Task.due_date, f'{days:+d} days')
+    return Task.due_date + func.make_interval(0, 0, 0, days)
+
+def _parse(action, value, user):
+    """Проверяет действие и параметр и возвращает значения для UPDATE."""
+    if action not in BULK_ACTIONS:
+        raise BulkTaskError('Неизвестное действие.')
+    if BULK_ACTIONS[action] and value in (None, ''):
+        raise BulkTaskError('Не указано новое значение.')
+
+    if action == 'complete':
+        action, value = 'status', COMPLETED
+    if action == 'status':
+        if value not in TASK_STATUSES:
+            raise BulkTaskError('Неизвестный статус задачи.')
+        values = {'status': value}
+        if value == COMPLETED:
+            values['completed_at'] = func.coalesce(Task.completed_at, datetime.utcnow())
+        return values
+    if action == 'priority':
+        if value not in TASK_PRIORITIES:
+            raise BulkTaskError('Неизвестный приоритет задачи.')
+        return {'priority': value}
+    if action == 'reassign':
+        if not user.is_manager():
+            raise BulkTaskError('Передавать задачи другим сотрудникам могут только менеджеры.')
+        try:
+            user_id = int(value)
+        except (TypeError, ValueError):
+            raise BulkTaskError('Некорректный сотрудник.')
+        if db.session.get(User, user_id) is None:
+            raise BulkTaskError('Сотрудник не найден.')
+        return {'user_id': user_id}
+    if action == 'shift_due':
+        try:
+            days = int(value)
+        except (TypeError, ValueError):
+            raise BulkTaskError('Сдвиг срока задается целым числом дней.')
+        if not days or abs(days) > 3650:
+            raise BulkTaskError('Сдвиг срока должен быть от 1 до 3650 дней.')
+        return {'due_date': _shift_due(days)}
+    return {}
+
+def bulk_update(ids, action, value, user):
+    """Применяет действие к задачам ids одним UPDATE или DELETE и возвращает число задач.
+
+    Как и действия над одной задачей, массовые действия доступны только исполнителю
+    задач (передать их другому сотруднику может только менеджер). Права на все
+    задачи проверяются одним сгруппированным запросом, который заодно
+    дает изменения счетчиков и список затронутых клиентов и сотрудников. Если хотя бы
+    одна задача недоступна или не найдена, ничего не меняется.
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        raise BulkTaskError('Не выбрано ни одной задачи.')
+    if len(ids) > BULK_LIMIT:
+        raise BulkTaskError(f'За один раз можно обработать не больше {BULK_LIMIT} задач.')
+    if not user.can_edit():
+        raise BulkTaskError('У вас нет прав на изменение задач.')
+    values = _parse(action, value, user)
+
+    criteria = [Task.id.in_(ids), Task.user_id == user.id]
+    groups = db.session.execute(
+        select(Task.user_id, Task.status, Task.customer_id, func.count())
+        .where(*criteria)
+        .group_by(Task.user_id, Task.status, Task.customer_id)).all()
+    if sum(count for *_, count in groups) != len(ids):
+        raise BulkTaskError('Некоторые задачи не найдены или недоступны.')
+
+    deltas = Counter()
+    touched = {'tasks'}
+    for user_id, status, customer_id, count in groups:
+        touched.update((f'user-tasks:{user_id}', f'customer:{customer_id}'))
+        old_key = task_key(user_id, status)
+        if action == 'delete':
+            deltas[old_key] -= count
+            continue
+        new_key = task_key(values.get('user_id', user_id), values.get('status', status))
+        if new_key != old_key:
+            deltas[old_key] -= count
+            deltas[new_key] += count
+    if 'user_id' in values:
+        touched.add(f'user-tasks:{values["user_id"]}')
+
+    if action == 'delete':
+        statement = delete(Task).where(*criteria)
+    else:
+        statement = update(Task).where(*criteria).values(**values)
+    result = db.session.execute(statement, execution_options={'synchronize_session': False})
+    apply_deltas(db.session.connection(), deltas)
+    db.session.commit()
+
+    # Массовые UPDATE/DELETE не вызывают событий ORM, кэш страниц сбрасываем сами
+    fragments.touch(*touched)
+    return result.rowcount
@@ -32,6 +32,18 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Добавляем data-label атрибуты для адаптивных таблиц
     prepareResponsiveTables();
+    
+    // Поиск клиента по мере ввода в формах задач
+    initCustomerLookup();
+    
+    // Выбор нескольких строк для массовых действий
+    initBulkSelect();
+    
+    // Догрузка длинных списков по мере прокрутки
+    initLazyLoad();
+    
+    // Ход выполнения фоновой задачи
+    initJobProgress();
 });
 
 // Инициализация всплывающих подсказок Bootstrap
@@ -325,4 +337,228 @@ function prepareResponsiveTables() {
             });
         });
     });
-} 
\ No newline at end of file
+}
+
+// Подсказки при выборе клиента: варианты подгружаются с сервера по мере ввода
+function initCustomerLookup() {
+    var selects = document.querySelectorAll('select.customer-lookup[data-lookup-url]');
+    selects.forEach(function(select) {
+        var url = select.getAttribute('data-lookup-url');
+        var searchInput = document.createElement('input');
+        searchInput.type = 'search';
+        searchInput.className = 'form-control mb-2';
+        searchInput.placeholder = 'Начните вводить название клиента';
+        searchInput.setAttribute('autocomplete', 'off');
+        select.parentNode.insertBefore(searchInput, select);
+        
+        var moreOption = null;
+        var currentQuery = '';
+        var currentPage = 1;
+        var debounceTimer = null;
+        var requestId = 0;
+        var lastValue = select.value;
+        
+        function loadOptions(query, page) {
+            var thisRequest = ++requestId;
+            var params = new URLSearchParams({ q: query, page: page });
+            fetch(url + '?' + params.toString(), { headers: { 'Accept': 'application/json' } })
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    // Ответ на устаревший запрос не должен перезаписать более новый
+                    if (thisRequest !== requestId) {
+                        return;
+                    }
+                    renderOptions(data, page > 1);
+                    lastValue = select.value;
+                });
+        }
+        
+        function renderOptions(data, append) {
+            var selectedValue = select.value;
+            if (moreOption) {
+                moreOption.remove();
+                moreOption = null;
+            }
+            if (!append) {
+                // Сохраняем выбранного клиента, даже если он не попал в результаты
+                Array.from(select.options).forEach(function(option) {
+                    if (option.value !== selectedValue || !option.selected) {
+                        option.remove();
+                    }
+                });
+            }
+            data.results.forEach(function(item) {
+                if (String(item.id) === selectedValue) {
+                    return;
+                }
+                var label = item.company ? item.text + ' (' + item.company + ')' : item.text;
+                select.appendChild(new Option(label, item.id));
+            });
+            if (data.has_more) {
+                moreOption = new Option('Показать ещё…', '');
+                moreOption.className = 'text-muted';
+                select.appendChild(moreOption);
+            }
+        }
+        
+        searchInput.addEventListener('input', function() {
+            clearTimeout(debounceTimer);
+            debounceTimer = setTimeout(function() {
+                currentQuery = searchInput.value.trim();
+                currentPage = 1;
+                loadOptions(currentQuery, currentPage);
+            }, 250);
+        });
+        
+        select.addEventListener('change', function() {
+            if (moreOption && select.value === '') {
+                currentPage += 1;
+                loadOptions(currentQuery, currentPage);
+                select.value = lastValue;
+            } else {
+                lastValue = select.value;
+            }
+        });
+        
+        // Первая страница подсказок, чтобы список не был пустым до начала ввода
+        loadOptions('', 1);
+    });
+}
+
+// Массовые действия: флажки строк привязаны к форме атрибутом form="<id формы>",
+// потому что в строках таблиц уже есть свои формы, а вкладывать формы нельзя
+function initBulkSelect() {
+    document.querySelectorAll('form[data-bulk-form]').forEach(function(form) {
+        var checkboxes = Array.from(document.querySelectorAll('input[type="checkbox"][form="' + form.id + '"]'));
+        var toggle = document.querySelector('[data-bulk-toggle="' + form.id + '"]');
+        var counter = form.querySelector('[data-bulk-count]');
+        var buttons = form.querySelectorAll('button[type="submit"]');
+        
+        function update() {
+            var selected = checkboxes.filter(function(checkbox) { return checkbox.checked; }).length;
+            if (counter) {
+                counter.textContent = selected;
+            }
+            buttons.forEach(function(button) {
+                button.disabled = selected === 0;
+            });
+            if (toggle) {
+                toggle.checked = selected > 0 && selected === checkboxes.length;
+                toggle.indeterminate = selected > 0 && selected < checkboxes.length;
+            }
+        }
+        
+        if (toggle) {
+            toggle.addEventListener('change', function() {
+                checkboxes.forEach(function(checkbox) {
+                    checkbox.checked = toggle.checked;
+                });
+                update();
+            });
+        }
+        checkboxes.forEach(function(checkbox) {
+            checkbox.addEventListener('change', update);
+        });
+        
+        form.addEventListener('submit', function(event) {
+            var message = form.getAttribute('data-confirm');
+            if (message && !window.confirm(message)) {
+                event.preventDefault();
+            }
+        });
+        
+        update();
+    });
+}
+
+// Кнопки «Показать ещё» с data-lazy-load: следующая порция строк приходит JSON-ом
+// {html, next} и добавляется в data-lazy-target; когда кнопка видна, грузим сами
+function initLazyLoad() {
+    var observer = null;
+    if ('IntersectionObserver' in window) {
+        observer = new IntersectionObserver(function(entries) {
+            entries.forEach(function(entry) {
+                if (entry.isIntersecting) {
+                    load(entry.target);
+                }
+            });
+        }, { rootMargin: '200px' });
+    }
+    
+    function load(button) {
+        if (button.disabled) {
+            return;
+        }
+        button.disabled = true;
+        fetch(button.getAttribute('data-lazy-load'), { headers: { 'Accept': 'application/json' } })
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(function(data) {
+                var target = document.querySelector(button.getAttribute('data-lazy-target'));
+                target.insertAdjacentHTML('beforeend', data.html);
+                if (!data.next) {
+                    if (observer) {
+                        observer.unobserve(button);
+                    }
+                    button.remove();
+                    return;
+                }
+                button.setAttribute('data-lazy-load', data.next);
+                button.disabled = false;
+                if (observer) {
+                    // Если кнопка все еще на экране, наблюдатель сообщит об этом заново
+                    observer.unobserve(button);
+                    observer.observe(button);
+                }
+            })
+            .catch(function() {
+                button.disabled = false;
+            });
+    }
+    
+    document.querySelectorAll('[data-lazy-load]').forEach(function(button) {
+        button.addEventListener('click', function() {
+            load(button);
+        });
+        if (observer) {
+            observer.observe(button);
+        }
+    });
+}
+
+// Страница фоновой задачи: опрашиваем состояние, пока задача не завершится,
+// затем перезагружаем страницу, чтобы показать результат
+function initJobProgress() {
+    var container = document.querySelector('[data-job-status-url]');
+    if (!container) {
+        return;
+    }
+    var url = container.getAttribute('data-job-status-url');
+    var bar = container.querySelector('[data-job-progress]');
+    var message = container.querySelector('[data-job-message]');
+    
+    function poll() {
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(function(response) { return response.json(); })
+            .then(function(job) {
+                if (job.status === 'done' || job.status === 'failed') {
+                    window.location.reload();
+                    return;
+                }
+                bar.style.width = job.progress + '%';
+                bar.textContent = job.progress + '%';
+                if (job.status === 'running') {
+                    message.textContent = job.message || 'Выполняется…';
+                }
+                setTimeout(poll, 1000);
+            })
+            .catch(function() {
+                setTimeout(poll, 5000);
+            });
+    }
+    setTimeout(poll, 1000);
+}
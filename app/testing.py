@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import db
+
+class QueryCounter:
+    """Собирает SQL-запросы, которые движок выполнил, пока счетчик активен."""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __repr__(self):
+        return f'<QueryCounter {self.count}>'
+
+@contextmanager
+def count_queries(app):
+    """Считает SQL-запросы внутри блока.
+
+    Пример:
+        with count_queries(app) as counter:
+            client.get('/tasks/')
+        assert counter.count <= 5
+    """
+    counter = QueryCounter()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._on_execute)
+
+def request_query_count(app, client, url, method='GET', **kwargs):
+    """Выполняет запрос тестовым клиентом и возвращает (ответ, число SQL-запросов)."""
+    with count_queries(app) as counter:
+        response = client.open(url, method=method, **kwargs)
+    return response, counter.count
@@ -0,0 +1,68 @@
+import pytest
+from datetime import datetime, timedelta
+from app import create_app, db, migrations
+from app.models import User, Customer, Task, Role
+
+PASSWORD = 'password123'
+
+def make_app(tmp_path, **config):
+    """Приложение с временной базой SQLite; схему создает вызывающий."""
+    return create_app(dict({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.sqlite'),
+        # Кэш фрагментов выключен: тесты проверяют запросы и рендеринг, а не кэш
+        'FRAGMENT_CACHE': 'null',
+        'JOB_FILES_DIR': str(tmp_path / 'job-files'),
+        'REMINDER_BACKEND': 'null',
+        # Дешевый хэш, чтобы вход не занимал секунду
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    }, **config))
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    with app.app_context():
+        db.create_all()
+        migrations.stamp()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def make_user(username, role=Role.EMPLOYEE):
+    user = User(username=username, email=f'{username}@example.com', role=role)
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def add_tasks(user_id, count, **values):
+    """Создает count задач пользователя, каждую у своего клиента; возвращает их id."""
+    now = datetime.utcnow()
+    tasks = []
+    for number in range(count):
+        customer = Customer(name=f'Клиент {user_id}-{number}')
+        task = Task(title=f'Задача {number}', customer=customer, user_id=user_id,
+                    due_date=now + timedelta(days=number - count // 2), **values)
+        db.session.add(task)
+        tasks.append(task)
+    db.session.commit()
+    return [task.id for task in tasks]
+
+def login(app, username):
+    client = app.test_client()
+    response = client.post('/auth/login', data={'username': username, 'password': PASSWORD})
+    assert response.status_code == 302
+    # Страница со flash-сообщением о входе не отдает 304, поэтому показываем его сразу
+    client.get('/about')
+    return client
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        return make_user('employee')
+
+@pytest.fixture
+def client(app, user_id):
+    return login(app, 'employee')
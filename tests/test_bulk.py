@@ -0,0 +1,35 @@
+from app import db
+from app.models import Task, StatCounter, Role
+from app.services.counters import get_counts
+from tests.conftest import add_tasks, make_user, login
+
+def test_bulk_complete_updates_tasks_and_counters(app, client, user_id):
+    with app.app_context():
+        ids = add_tasks(user_id, 4, status='Новая')
+
+    response = client.post('/tasks/bulk', json={'ids': ids[:3], 'action': 'complete'})
+    assert response.get_json() == {'updated': 3}
+
+    with app.app_context():
+        assert [db.session.get(Task, task_id).status for task_id in ids] == ['Завершена'] * 3 + ['Новая']
+        assert all(db.session.get(Task, task_id).completed_at for task_id in ids[:3])
+        assert get_counts(StatCounter.TASK_STATUS, user_id) == {'Завершена': 3, 'Новая': 1}
+
+def test_bulk_rejects_other_users_tasks(app, client, user_id):
+    with app.app_context():
+        own = add_tasks(user_id, 2)
+        manager_id = make_user('manager', Role.MANAGER)
+        foreign = add_tasks(manager_id, 1)
+
+    # Задачи чужого пользователя недоступны даже менеджеру; не меняется ничего
+    manager = login(app, 'manager')
+    response = manager.post('/tasks/bulk', json={'ids': own + foreign, 'action': 'delete'})
+    assert response.status_code == 400
+    with app.app_context():
+        assert Task.query.count() == 3
+
+    # Передать задачи другому может только менеджер
+    response = client.post('/tasks/bulk', json={'ids': own, 'action': 'reassign', 'value': manager_id})
+    assert response.status_code == 400
+    response = manager.post('/tasks/bulk', json={'ids': foreign, 'action': 'reassign', 'value': user_id})
+    assert response.get_json() == {'updated': 1}
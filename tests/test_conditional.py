@@ -0,0 +1,34 @@
+from app import db
+from app.models import Task
+from tests.conftest import add_tasks
+
+def test_task_page_answers_not_modified_until_task_changes(app, client, user_id):
+    with app.app_context():
+        task_id = add_tasks(user_id, 1)[0]
+
+    first = client.get(f'/tasks/{task_id}')
+    assert first.status_code == 200 and first.headers['ETag']
+
+    cached = client.get(f'/tasks/{task_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+
+    with app.app_context():
+        db.session.get(Task, task_id).title = 'Новое название'
+        db.session.commit()
+    changed = client.get(f'/tasks/{task_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != first.headers['ETag']
+    assert 'Новое название' in changed.get_data(as_text=True)
+
+def test_if_modified_since_alone_does_not_answer_not_modified(app, client, user_id):
+    with app.app_context():
+        add_tasks(user_id, 2)
+    response = client.get('/tasks/')
+    assert 'Last-Modified' not in response.headers
+
+    # Удаление задачи не меняет max(updated_at), но страница уже другая
+    with app.app_context():
+        db.session.delete(Task.query.first())
+        db.session.commit()
+    response = client.get('/tasks/', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
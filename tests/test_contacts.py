@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Customer, Contact
+
+def _primary(customer_id):
+    return [contact.last_name for contact in
+            Contact.query.filter_by(customer_id=customer_id, is_primary=True)]
+
+def test_switching_primary_contact(app, client):
+    with app.app_context():
+        customer = Customer(name='Альфа')
+        db.session.add(customer)
+        db.session.commit()
+        customer_id = customer.id
+
+    for last_name in ('Петрова', 'Сидоров'):
+        response = client.post(f'/customers/{customer_id}/contacts/add',
+                               data={'first_name': 'Имя', 'last_name': last_name, 'is_primary': 'y'})
+        assert response.status_code == 302
+    client.post(f'/customers/{customer_id}/contacts/add', data={'first_name': 'Имя', 'last_name': 'Орлов'})
+    with app.app_context():
+        assert _primary(customer_id) == ['Сидоров']
+        petrova = Contact.query.filter_by(last_name='Петрова').one().id
+
+    response = client.post(f'/customers/contacts/{petrova}/edit',
+                           data={'first_name': 'Имя', 'last_name': 'Петрова', 'is_primary': 'y'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert _primary(customer_id) == ['Петрова']
+        assert Contact.query.filter_by(customer_id=customer_id).count() == 3
+
+def test_second_primary_contact_is_rejected_by_index(app):
+    with app.app_context():
+        customer = Customer(name='Альфа', contacts=[Contact(first_name='Имя', last_name='Петрова', is_primary=True),
+                                                    Contact(first_name='Имя', last_name='Орлов')])
+        db.session.add(customer)
+        db.session.commit()
+
+        db.session.add(Contact(first_name='Имя', last_name='Сидоров', is_primary=True, customer_id=customer.id))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+        # Неосновных контактов может быть сколько угодно, основной — один на клиента
+        db.session.add_all([Contact(first_name='Имя', last_name='Сидоров', customer_id=customer.id),
+                            Contact(first_name='Имя', last_name='Иванов', is_primary=True,
+                                    customer=Customer(name='Бета'))])
+        db.session.commit()
+        assert _primary(customer.id) == ['Петрова']
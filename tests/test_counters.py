@@ -0,0 +1,21 @@
+from app import db
+from app.models import StatCounter, Task, Customer
+from app.services.counters import get_counts, rebuild_counters
+from tests.conftest import add_tasks
+
+def test_counters_follow_task_changes(app, user_id):
+    with app.app_context():
+        ids = add_tasks(user_id, 3, status='Новая')
+        assert get_counts(StatCounter.TASK_STATUS, user_id) == {'Новая': 3}
+
+        task = db.session.get(Task, ids[0])
+        task.status = 'Завершена'
+        db.session.delete(db.session.get(Task, ids[1]))
+        db.session.commit()
+        assert get_counts(StatCounter.TASK_STATUS, user_id) == {'Новая': 1, 'Завершена': 1}
+        assert sum(get_counts(StatCounter.CUSTOMER_STATUS).values()) == Customer.query.count()
+
+        # Пересчет с нуля дает те же значения, что и поддерживаемые событиями
+        before = get_counts(StatCounter.TASK_STATUS, user_id)
+        rebuild_counters()
+        assert get_counts(StatCounter.TASK_STATUS, user_id) == before
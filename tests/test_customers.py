@@ -0,0 +1,58 @@
+import sqlite3
+import pytest
+from app import db
+from app.models import Customer, Contact, Task, StatCounter
+from app.services import customers, search
+from app.services.counters import get_counts, rebuild_counters
+from tests.conftest import make_user
+
+def _customer(name, status, user_ids):
+    customer = Customer(name=name, status=status, contacts=[
+        Contact(first_name='Ирина', last_name=f'Петрова{name}', is_primary=True),
+        Contact(first_name='Олег', last_name=f'Сидоров{name}')])
+    db.session.add(customer)
+    for number, user_id in enumerate(user_ids):
+        db.session.add(Task(title=f'Звонок {name}', customer=customer, user_id=user_id,
+                            status=['Новая', 'Завершена'][number % 2]))
+    db.session.commit()
+    return customer.id
+
+def test_delete_customers_updates_counters_and_search(app):
+    with app.app_context():
+        first, second = make_user('first'), make_user('second')
+        gone = [_customer('Альфа', 'Новый', [first, first, second]),
+                _customer('Бета', 'Активный', [second, None])]
+        kept = _customer('Гамма', 'Новый', [first])
+        assert search.search_contacts('Петрова')
+
+        assert customers.delete_customers(gone + [gone[0]]) == 2
+        assert Contact.query.filter(Contact.customer_id.in_(gone)).count() == 0
+        assert Task.query.filter(Task.customer_id.in_(gone)).count() == 0
+        assert [customer.id for customer in search.search_customers('Альфа Бета')] == []
+        assert {contact.customer_id for contact in search.search_contacts('Петрова')} == {kept}
+
+        assert get_counts(StatCounter.CUSTOMER_STATUS) == {'Новый': 1}
+        assert get_counts(StatCounter.TASK_STATUS, first) == {'Новая': 1}
+        assert get_counts(StatCounter.TASK_STATUS, second) == {}
+        assert get_counts(StatCounter.TASK_STATUS, 0) == {}
+        # Поддерживаемые значения совпадают с пересчетом с нуля
+        counts = [get_counts(StatCounter.CUSTOMER_STATUS), get_counts(StatCounter.TASK_STATUS, first)]
+        rebuild_counters()
+        assert [get_counts(StatCounter.CUSTOMER_STATUS), get_counts(StatCounter.TASK_STATUS, first)] == counts
+
+def test_delete_chunk_blocks_concurrent_writes(app, tmp_path):
+    with app.app_context():
+        customer_id = _customer('Альфа', 'Новый', [None])
+        customers._lock_chunk([customer_id])
+        other = sqlite3.connect(str(tmp_path / 'test.sqlite'), timeout=0)
+        try:
+            # Пока счетчики посчитаны, но DELETE не зафиксирован, задачу клиенту не добавить
+            with pytest.raises(sqlite3.OperationalError, match='locked'):
+                other.execute("INSERT INTO task (title, customer_id, status) VALUES ('Новая', ?, 'Новая')",
+                              (customer_id,))
+            db.session.rollback()
+            other.execute("INSERT INTO task (title, customer_id, status) VALUES ('Новая', ?, 'Новая')",
+                          (customer_id,))
+            other.commit()
+        finally:
+            other.close()
@@ -0,0 +1,28 @@
+import pytest
+from app import db, migrations
+from app.models import User
+from tests.conftest import make_app, make_user, add_tasks, login
+
+@pytest.fixture
+def cached_app(tmp_path):
+    app = make_app(tmp_path, FRAGMENT_CACHE='memory')
+    with app.app_context():
+        db.create_all()
+        migrations.stamp()
+    return app
+
+def test_cached_pages_show_renamed_user(cached_app):
+    app = cached_app
+    with app.app_context():
+        user_id = make_user('employee')
+        add_tasks(user_id, 1)
+        customer_id = db.session.get(User, user_id).tasks.first().customer_id
+    client = login(app, 'employee')
+    assert 'Добро пожаловать, employee!' in client.get('/dashboard').get_data(as_text=True)
+    assert '<td>employee</td>' in client.get(f'/customers/{customer_id}').get_data(as_text=True)
+
+    with app.app_context():
+        db.session.get(User, user_id).username = 'renamed'
+        db.session.commit()
+    assert 'Добро пожаловать, renamed!' in client.get('/dashboard').get_data(as_text=True)
+    assert '<td>renamed</td>' in client.get(f'/customers/{customer_id}').get_data(as_text=True)
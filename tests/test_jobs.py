@@ -0,0 +1,74 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app import db
+from app.models import Job, User, Role
+from app.services import jobs
+from tests.conftest import make_user, login
+
+def _make_stale(job_id):
+    db.session.execute(update(Job).where(Job.id == job_id)
+                       .values(heartbeat_at=datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+
+def test_job_is_claimed_once_and_runs(app):
+    with app.app_context():
+        assert not app.config['JOBS_EAGER']
+        job_id = jobs.enqueue('rollup').id
+        assert db.session.get(Job, job_id).status == Job.QUEUED
+
+        assert jobs.claim('first') == job_id
+        assert jobs.claim('second') is None
+        assert jobs.run(job_id, 'first')
+
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.worker, job.attempts, job.progress) == (Job.DONE, 'first', 1, 100)
+        assert 'days' in jobs.result_of(job)
+
+def test_stale_job_is_requeued_and_old_worker_cannot_finish_it(app):
+    with app.app_context():
+        job_id = jobs.enqueue('rollup').id
+        jobs.claim('lost')
+        _make_stale(job_id)
+        assert jobs.requeue_stale() == (1, 0)
+        assert db.session.get(Job, job_id).status == Job.QUEUED
+
+        assert jobs.claim('new') == job_id
+        # Пропавший исполнитель вернулся: его итог не должен перезаписать задачу
+        assert not jobs.run(job_id, 'lost')
+        db.session.expire_all()
+        assert db.session.get(Job, job_id).status == Job.RUNNING
+
+def test_stale_job_fails_after_max_attempts(app):
+    with app.app_context():
+        job_id = jobs.enqueue('rollup').id
+        for _ in range(app.config['JOB_MAX_ATTEMPTS']):
+            jobs.claim('lost')
+            _make_stale(job_id)
+            jobs.requeue_stale()
+        job = db.session.get(Job, job_id)
+        assert job.status == Job.FAILED and job.attempts == app.config['JOB_MAX_ATTEMPTS']
+
+def test_stale_import_is_failed_not_retried(app):
+    with app.app_context():
+        path = os.path.join(jobs.files_dir(), 'upload-test.csv')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write('name\nАльфа\n')
+        job_id = jobs.enqueue('import-customers', {'path': path, 'fmt': 'csv'}).id
+        jobs.claim('lost')
+        _make_stale(job_id)
+
+        assert jobs.requeue_stale() == (0, 1)
+        assert db.session.get(Job, job_id).status == Job.FAILED
+        assert not os.path.exists(path)
+
+def test_job_page_is_visible_to_owner_and_admin_only(app, client, user_id):
+    with app.app_context():
+        job_id = jobs.enqueue('rollup', user=db.session.get(User, user_id)).id
+        make_user('other')
+        make_user('admin', Role.ADMIN)
+
+    assert client.get(f'/jobs/{job_id}').status_code == 200
+    assert client.get(f'/jobs/{job_id}/status').get_json()['status'] == Job.QUEUED
+    assert login(app, 'other').get(f'/jobs/{job_id}').status_code == 403
+    assert login(app, 'admin').get(f'/jobs/{job_id}').status_code == 200
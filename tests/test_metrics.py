@@ -0,0 +1,38 @@
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import db, migrations
+from app.services import metrics
+from tests.conftest import make_app, login, make_user
+
+@pytest.fixture
+def metrics_app(tmp_path):
+    app = make_app(tmp_path, METRICS_ENABLED=True)
+    with app.app_context():
+        db.create_all()
+        migrations.stamp()
+    return app
+
+def test_failed_statement_does_not_leak_start_time(metrics_app):
+    with metrics_app.test_request_context('/dashboard'):
+        metrics._start_request()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                db.session.execute(text('SELECT * FROM missing_table'))
+            db.session.rollback()
+        connection = db.session.connection()
+        assert db.session.execute(text('SELECT 1')).scalar() == 1
+        assert [statement for _, statement in g.metrics_statements] == ['SELECT 1']
+        assert 'metrics_started' not in connection.info
+
+def test_server_timing_counts_queries(metrics_app):
+    with metrics_app.app_context():
+        make_user('employee')
+    client = login(metrics_app, 'employee')
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    assert 'queries"' in response.headers['Server-Timing']
+    with metrics_app.app_context():
+        rows = metrics.get_registry().summary()
+    assert 'main.dashboard' in {row['endpoint'] for row in rows}
@@ -0,0 +1,89 @@
+import sqlite3
+from sqlalchemy import text
+from app import db, migrations
+from app.models import Customer, Contact, Task, StatCounter
+from app.services.counters import get_counts
+from app.services.search import search_customers, search_contacts
+from tests.conftest import make_app
+
+# Схема исходной версии приложения, до всех миграций
+BASELINE_SCHEMA = '''
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(64) NOT NULL, email VARCHAR(120) NOT NULL,
+    password_hash VARCHAR(128) NOT NULL, role VARCHAR(20) NOT NULL, first_name VARCHAR(30),
+    last_name VARCHAR(30), position VARCHAR(50), created_at DATETIME, last_login DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_user_username ON user (username);
+CREATE UNIQUE INDEX ix_user_email ON user (email);
+CREATE TABLE customer (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, company VARCHAR(100), email VARCHAR(120),
+    phone VARCHAR(20), address VARCHAR(200), status VARCHAR(20), notes TEXT,
+    created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id)
+);
+CREATE TABLE contact (
+    id INTEGER NOT NULL, first_name VARCHAR(50) NOT NULL, last_name VARCHAR(50) NOT NULL,
+    position VARCHAR(100), email VARCHAR(120), phone VARCHAR(20), is_primary BOOLEAN, notes TEXT,
+    created_at DATETIME, updated_at DATETIME, customer_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(customer_id) REFERENCES customer (id)
+);
+CREATE TABLE task (
+    id INTEGER NOT NULL, title VARCHAR(100) NOT NULL, description TEXT, due_date DATETIME,
+    priority VARCHAR(20), status VARCHAR(20), created_at DATETIME, updated_at DATETIME,
+    completed_at DATETIME, customer_id INTEGER NOT NULL, user_id INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(customer_id) REFERENCES customer (id),
+    FOREIGN KEY(user_id) REFERENCES user (id)
+);
+'''
+
+BASELINE_ROWS = '''
+INSERT INTO user (id, username, email, password_hash, role) VALUES (1, 'ivan', 'ivan@example.com', 'x', 'employee');
+INSERT INTO customer (id, name, company, status, created_at, updated_at) VALUES
+    (1, 'Альфа', 'ООО Альфа', 'Активный', '2024-01-01 10:00:00', '2024-01-01 10:00:00'),
+    (2, 'Бета', 'ООО Бета', 'Новый', '2024-01-02 10:00:00', '2024-01-02 10:00:00');
+INSERT INTO contact (id, first_name, last_name, is_primary, customer_id) VALUES
+    (1, 'Иван', 'Петров', 1, 1),
+    (2, 'Петр', 'Сидоров', 1, 1),
+    (3, 'Анна', 'Смирнова', 0, 2),
+    (4, 'Потерянный', 'Контакт', 0, 99);
+INSERT INTO task (id, title, status, customer_id, user_id) VALUES
+    (1, 'Позвонить', 'Новая', 1, 1),
+    (2, 'Отправить договор', 'Завершена', 1, 1),
+    (3, 'Встреча', 'Новая', 2, 1),
+    (4, 'Без клиента', 'Новая', 99, 1),
+    (5, 'Удаленный исполнитель', 'Новая', 2, 42);
+'''
+
+def test_upgrade_keeps_data_of_baseline_database(tmp_path):
+    # Старая база: внешние ключи не проверялись, поэтому есть строки-сироты
+    connection = sqlite3.connect(tmp_path / 'test.sqlite')
+    connection.executescript(BASELINE_SCHEMA + BASELINE_ROWS)
+    connection.close()
+
+    app = make_app(tmp_path)
+    with app.app_context():
+        applied = migrations.upgrade()
+        assert [version for version, _ in applied] == [version for version, _, _ in migrations.MIGRATIONS]
+        assert migrations.upgrade() == []
+
+        # Данные сохранились, сироты удалены, исполнитель, которого нет, снят
+        assert [customer.name for customer in Customer.query.order_by(Customer.id)] == ['Альфа', 'Бета']
+        assert sorted(contact.id for contact in Contact.query) == [1, 2, 3]
+        assert sorted(task.id for task in Task.query) == [1, 2, 3, 5]
+        assert db.session.get(Task, 5).user_id is None
+
+        # Основным остался самый ранний контакт, второй основной запрещен индексом
+        assert [contact.id for contact in Contact.query.filter_by(is_primary=True)] == [1]
+
+        # Поисковый индекс и счетчики построены по перенесенным данным
+        assert [customer.id for customer in search_customers('альф')] == [1]
+        assert [contact.id for contact in search_contacts('смирн')] == [3]
+        assert get_counts(StatCounter.TASK_STATUS, 1) == {'Новая': 2, 'Завершена': 1}
+        assert get_counts(StatCounter.CUSTOMER_STATUS) == {'Активный': 1, 'Новый': 1}
+
+        # Новые внешние ключи удаляют контакты и задачи вместе с клиентом
+        db.session.execute(text('DELETE FROM customer WHERE id = 1'))
+        db.session.commit()
+        assert sorted(contact.id for contact in Contact.query) == [3]
+        assert sorted(task.id for task in Task.query) == [3, 5]
+        assert search_contacts('петров') == []
@@ -0,0 +1,58 @@
+from app import db
+from app.models import Task
+from app.services.pagination import keyset_paginate
+from tests.conftest import add_tasks
+
+def _walk(query, columns, **options):
+    pages = [keyset_paginate(query, columns, 4, **options)]
+    while pages[-1].has_next:
+        pages.append(keyset_paginate(query, columns, 4, after=pages[-1].next_cursor, **options))
+    return pages
+
+def test_keyset_pages_cover_all_rows_once(app, user_id):
+    with app.app_context():
+        ids = add_tasks(user_id, 10)
+        # Задачи без срока: NULL в первом столбце ключа
+        for task_id in ids[:3]:
+            db.session.get(Task, task_id).due_date = None
+        db.session.commit()
+
+        columns = (Task.due_date, Task.id)
+        for descending in (False, True):
+            expected = [task.id for task in Task.query.order_by(
+                *(column.desc() if descending else column for column in columns))]
+            pages = _walk(Task.query, columns, descending=descending, nullable=True)
+            assert [task.id for page in pages for task in page.items] == expected
+
+            # Назад со второй страницы — снова первая
+            back = keyset_paginate(Task.query, columns, 4, before=pages[1].prev_cursor,
+                                   descending=descending, nullable=True)
+            assert [task.id for task in back.items] == [task.id for task in pages[0].items]
+            assert not back.has_prev
+
+def test_keyset_ignores_forged_cursor(app, user_id):
+    with app.app_context():
+        add_tasks(user_id, 5)
+        page = keyset_paginate(Task.query, (Task.id,), 4, after='forged')
+        assert [task.id for task in page.items] == [1, 2, 3, 4]
+
+def test_contacts_page_with_null_primary_flag(app):
+    from app.models import Customer, Contact
+    from app.routes.customer import _contacts_page
+    with app.app_context():
+        customer = Customer(name='Альфа', contacts=[
+            Contact(first_name='Имя', last_name=str(number), is_primary=number == 2)
+            for number in range(45)])
+        db.session.add(customer)
+        db.session.commit()
+        # При вставке через ORM None заменяется значением по умолчанию, поэтому NULL — отдельным UPDATE
+        db.session.execute(db.update(Contact).where(Contact.id % 2 == 0).values(is_primary=None))
+        db.session.commit()
+        assert Contact.query.filter(Contact.is_primary.is_(None)).count() == 22
+
+        pages = [_contacts_page(customer.id)]
+        while pages[-1].has_next:
+            pages.append(_contacts_page(customer.id, pages[-1].next_cursor))
+        names = [contact.last_name for page in pages for contact in page.items]
+        assert len(pages) == 3 and sorted(names, key=int) == [str(number) for number in range(45)]
+        assert names[0] == '2'
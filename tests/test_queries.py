@@ -0,0 +1,15 @@
+import pytest
+from app.testing import request_query_count
+from tests.conftest import add_tasks
+
+@pytest.mark.parametrize('url', ['/tasks/', '/dashboard'])
+def test_query_count_does_not_grow_with_tasks(app, client, user_id, url):
+    counts = []
+    for _ in range(2):
+        with app.app_context():
+            add_tasks(user_id, 10)
+        client.get(url)
+        response, count = request_query_count(app, client, url)
+        assert response.status_code == 200
+        counts.append(count)
+    assert counts[0] == counts[1]
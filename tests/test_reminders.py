@@ -0,0 +1,83 @@
+import os
+from datetime import datetime, timedelta
+from app import db
+from app.models import Customer, Task, ReminderDigest
+from app.services import reminders
+from tests.conftest import make_user
+
+class FailingBackend:
+    def __init__(self):
+        self.calls = 0
+
+    def send(self, user, digest, items):
+        self.calls += 1
+        raise OSError('SMTP недоступен')
+
+def _task(user_id, due_date, status='Новая'):
+    db.session.add(Task(title=f'Срок {due_date:%d %H:%M}', customer=Customer(name='Альфа'),
+                        user_id=user_id, due_date=due_date, status=status))
+    db.session.commit()
+
+def _items(user_id):
+    return [(item['kind'], item['title']) for digest in
+            ReminderDigest.query.filter_by(user_id=user_id).order_by(ReminderDigest.id)
+            for item in reminders.items_of(digest)]
+
+def test_first_run_window_and_due_soon_overdue_split(app, user_id, tmp_path):
+    now = datetime(2026, 3, 10, 12, 0)
+    outbox = tmp_path / 'outbox'
+    app.extensions['reminder_backend'] = reminders.FileBackend(str(outbox))
+    with app.app_context():
+        _task(user_id, now - timedelta(hours=2))                      # просрочена в окне
+        _task(user_id, now - timedelta(hours=30))                     # просрочена раньше окна
+        _task(user_id, now + timedelta(hours=5))                      # срок в ближайшие сутки
+        _task(user_id, now + timedelta(hours=30))                     # срок еще не близко
+        _task(user_id, now - timedelta(hours=1), status='Завершена')  # завершенные не напоминаем
+
+        report = reminders.run(now)
+        assert (report.window_start, report.window_end) == (now - timedelta(hours=24), now)
+        assert (report.digests, report.overdue, report.due_soon, report.delivered) == (1, 1, 1, 1)
+        assert _items(user_id) == [('overdue', 'Срок 10 10:00'), ('due_soon', 'Срок 10 17:00')]
+        assert os.listdir(outbox) == [f'digest-{ReminderDigest.query.one().id}.eml']
+
+def test_consecutive_windows_notify_each_task_once(app, user_id):
+    now = datetime(2026, 3, 10, 12, 0)
+    with app.app_context():
+        _task(user_id, now + timedelta(hours=3))
+        reminders.run(now)
+        # Тот же момент еще раз: окно пустое, отметка не сдвигается
+        assert reminders.run(now).window_start is None
+
+        # Через 4 часа срок наступил: одно напоминание о просрочке, без повтора «скоро срок»
+        report = reminders.run(now + timedelta(hours=4))
+        assert report.window_start == now
+        assert (report.overdue, report.due_soon) == (1, 0)
+        report = reminders.run(now + timedelta(hours=8))
+        assert (report.overdue, report.due_soon, report.digests) == (0, 0, 0)
+        assert _items(user_id) == [('due_soon', 'Срок 10 15:00'), ('overdue', 'Срок 10 15:00')]
+
+def test_failed_delivery_is_retried_up_to_limit(app, user_id):
+    backend = FailingBackend()
+    app.extensions['reminder_backend'] = backend
+    now = datetime(2026, 3, 10, 12, 0)
+    with app.app_context():
+        _task(user_id, now - timedelta(hours=1))
+        report = reminders.run(now)
+        assert (report.delivered, report.failed) == (0, 1)
+        for _ in range(reminders.MAX_DELIVERY_ATTEMPTS + 1):
+            reminders.deliver_pending()
+
+        digest = ReminderDigest.query.one()
+        assert backend.calls == reminders.MAX_DELIVERY_ATTEMPTS
+        assert digest.delivery_attempts == reminders.MAX_DELIVERY_ATTEMPTS
+        assert digest.delivered_at is None and 'SMTP' in digest.delivery_error
+
+def test_reminders_page_marks_digests_read(app, client, user_id):
+    with app.app_context():
+        _task(user_id, datetime.utcnow() - timedelta(hours=1))
+        reminders.run()
+        assert reminders.unread_count(user_id) == 1
+    assert 'Новых напоминаний о сроках задач: 1' in client.get('/dashboard').get_data(as_text=True)
+    client.post('/reminders/read')
+    with app.app_context():
+        assert reminders.unread_count(user_id) == 0
@@ -0,0 +1,69 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from app import db
+from app.models import Customer, Task, TaskDailyStat, CustomerDailyStat, Watermark
+from app.services import reports, rollup
+from tests.conftest import make_user
+
+START, END = datetime(2026, 1, 1), datetime(2026, 3, 1)
+
+def _seed(user_ids):
+    statuses = ['Новая', 'В работе', 'Завершена', 'Отложена']
+    for number in range(60):
+        created = START + timedelta(days=number, hours=number % 24)
+        status = statuses[number % 4]
+        customer = Customer(name=f'Клиент {number}', created_at=created,
+                            status=[None, 'Новый', 'Активный'][number % 3])
+        db.session.add(Task(title=f'Задача {number}', customer=customer, created_at=created,
+                            user_id=user_ids[number % 3], status=status,
+                            due_date=created + timedelta(days=number % 5),
+                            completed_at=created + timedelta(days=number % 7) if status == 'Завершена' else None))
+    db.session.commit()
+
+def _stat_rows():
+    return (db.session.execute(select(TaskDailyStat.__table__).order_by(*TaskDailyStat.__table__.primary_key)).all(),
+            db.session.execute(select(CustomerDailyStat.__table__).order_by(*CustomerDailyStat.__table__.primary_key)).all())
+
+def test_rollup_matches_raw_reports(app):
+    with app.app_context():
+        _seed([make_user('first'), make_user('second'), None])
+        assert rollup.watermark() is None
+        raw = reports.task_throughput(START, END), reports.new_customers(START, END)
+        assert sum(row['total'] for row in raw[0]['rows']) == 13
+        assert sum(row['total'] for row in raw[1]['rows']) == 59
+
+        report = rollup.rollup(date(2026, 1, 1), date(2026, 2, 28))
+        assert report.days == 59 and report.task_rows and report.customer_rows
+        assert rollup.watermark() == date(2026, 2, 28)
+        assert reports._split(START, END) == ((START, END), None)
+        assert (reports.task_throughput(START, END), reports.new_customers(START, END)) == raw
+
+        # Граница отметки внутри периода: часть из итогов, часть по исходным таблицам
+        db.session.execute(db.delete(TaskDailyStat).where(TaskDailyStat.day > date(2026, 1, 20)))
+        db.session.execute(db.delete(CustomerDailyStat).where(CustomerDailyStat.day > date(2026, 1, 20)))
+        db.session.get(Watermark, rollup.WATERMARK).value = datetime(2026, 1, 20)
+        db.session.commit()
+        assert (reports.task_throughput(START, END), reports.new_customers(START, END)) == raw
+
+def test_watermark_and_repeated_rollup(app):
+    with app.app_context():
+        _seed([make_user('first'), make_user('second'), None])
+        rollup.rollup(date(2026, 1, 1), date(2026, 1, 31))
+        assert rollup.watermark() == date(2026, 1, 31)
+        before = _stat_rows()
+
+        # Пересчет периода с пропуском после отметки (flask rollup --from) ее не сдвигает
+        rollup.rollup(date(2026, 2, 10), date(2026, 2, 20))
+        assert rollup.watermark() == date(2026, 1, 31)
+
+        # Продолжение без пропуска сдвигает
+        rollup.rollup(date(2026, 2, 1), date(2026, 2, 28))
+        assert rollup.watermark() == date(2026, 2, 28)
+
+        # Повторный пересчет уже посчитанного периода дает те же строки и не трогает отметку
+        after = _stat_rows()
+        rollup.rollup(date(2026, 1, 1), date(2026, 1, 31))
+        assert _stat_rows() == after
+        january = lambda rows: [row for row in rows if row.day < date(2026, 2, 1)]
+        assert january(after[0]) == january(before[0]) and january(after[1]) == january(before[1])
+        assert rollup.watermark() == date(2026, 2, 28)